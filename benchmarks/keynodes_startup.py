@@ -0,0 +1,71 @@
+"""
+This benchmark compares cold and warm startup of a process that uses many keynodes.
+
+Cold startup resolves every identifier in the KB, warm startup loads keynodes
+from the sqlite cache saved by the previous ScServer and validates them by types.
+
+Usage: python benchmarks/keynodes_startup.py [--url ws://localhost:8090/ws_json] [--keynodes 1000]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from typing import Callable, Dict, Optional
+
+from sc_client.constants import sc_type
+from sc_client.constants.sc_type import ScType
+
+from sc_kpm import ScKeynodes, ScKeynodesContainer, ScServer
+from sc_kpm.identifiers import _IdentifiersResolver
+from sc_kpm.sc_keynodes import Idtf
+
+
+def reset_keynodes() -> None:
+    # pylint: disable=protected-access
+    ScKeynodes._clear()
+    ScKeynodesContainer._invalidate_all()
+    _IdentifiersResolver.is_resolved = False
+
+
+def measure_startup(server: ScServer, resolve: Callable[[], None]) -> float:
+    reset_keynodes()
+    start = time.perf_counter()
+    server.connect()
+    resolve()
+    duration = time.perf_counter() - start
+    server.disconnect()
+    return duration
+
+
+def main(url: str, keynodes_count: int, cache_path: Optional[str]) -> None:
+    types_map: Dict[Idtf, Optional[ScType]] = {
+        f"benchmark_keynode_{index}": sc_type.CONST_NODE for index in range(keynodes_count)
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        cache_path = cache_path or os.path.join(directory, "keynodes.sqlite3")
+        server = ScServer(url)
+        cached_server = ScServer(url, keynodes_cache_path=cache_path)
+
+        measure_startup(server, lambda: ScKeynodes.prefetch(types_map))  # Generate keynodes in the KB
+        results = {
+            "cold, resolve each": measure_startup(
+                server, lambda: [ScKeynodes.resolve(idtf, type_value) for idtf, type_value in types_map.items()]
+            ),
+            "cold, prefetch": measure_startup(server, lambda: ScKeynodes.prefetch(types_map)),
+        }
+        measure_startup(cached_server, lambda: ScKeynodes.prefetch(types_map))  # Save keynodes to the cache
+        results["warm, cache file"] = measure_startup(cached_server, lambda: ScKeynodes.prefetch(types_map))
+
+    print(f"Startup with {keynodes_count} keynodes:")
+    for name, duration in results.items():
+        print(f"  {name:<20} {duration * 1000:10.2f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="ws://localhost:8090/ws_json", help="sc-server url")
+    parser.add_argument("--keynodes", type=int, default=1000, help="number of keynodes")
+    parser.add_argument("--cache", default=None, help="path to the keynodes cache file")
+    args = parser.parse_args()
+    main(args.url, args.keynodes, args.cache)
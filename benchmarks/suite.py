@@ -0,0 +1,218 @@
+"""
+This benchmark suite measures sc-sets, action utils and agents dispatch.
+
+It runs against the in-process sc-memory stand-in with simulated latency of each request (or against the sc-server
+with --url) and measures wall time and number of round trips to the sc-server of each case.
+Results are written as JSON, so runs can be compared.
+
+Usage: python benchmarks/suite.py [--url memory://?latency=0.001] [--sizes 10,100,1000,10000,100000]
+       [--agents 1,10,50] [--actions 100] [--filter set] [--output results.json]
+"""
+
+import argparse
+import json
+import platform
+import sys
+import threading
+import time
+from functools import partial
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple
+
+from sc_client.constants import sc_type
+from sc_client.models import ScAddr
+
+from sc_kpm import ScAgentClassic, ScModule, ScResult, ScServer
+from sc_kpm.identifiers import CommonIdentifiers
+from sc_kpm.sc_sets import ScNumberedSet, ScOrientedSet, ScSet
+from sc_kpm.sc_tracer import ScTracer
+from sc_kpm.utils import generate_nodes
+from sc_kpm.utils.action_utils import call_agent, execute_agent, finish_action_with_status
+
+Setup = Callable[[int], Callable[[], Any]]  # Prepare the case of the size and return the measured function
+
+
+class Case(NamedTuple):
+    name: str
+    setup: Setup
+    max_size: int  # Sizes above it are skipped, e.g. for cases with a request for each element
+
+
+def generate_elements(size: int) -> List[ScAddr]:
+    return generate_nodes(*[sc_type.CONST_NODE] * size)
+
+
+def set_build(size: int) -> Callable[[], Any]:
+    elements = generate_elements(size)
+    return lambda: ScSet(*elements)
+
+
+def set_iterate(size: int) -> Callable[[], Any]:
+    sc_set = ScSet(*generate_elements(size))
+    return lambda: list(sc_set)
+
+
+def set_contains(size: int) -> Callable[[], Any]:
+    elements = generate_elements(size)
+    sc_set = ScSet(*elements)
+    return lambda: elements[-1] in sc_set
+
+
+def oriented_set_append(size: int) -> Callable[[], Any]:
+    elements = generate_elements(size)
+    sc_set = ScOrientedSet()
+
+    def append() -> None:
+        for element in elements:
+            sc_set.add(element)
+
+    return append
+
+
+def oriented_set_iterate(size: int) -> Callable[[], Any]:
+    sc_set = ScOrientedSet(*generate_elements(size))
+    return lambda: list(sc_set)
+
+
+def numbered_set_add(size: int) -> Callable[[], Any]:
+    elements = generate_elements(size)
+    return lambda: ScNumberedSet(*elements)
+
+
+def numbered_set_remove(size: int) -> Callable[[], Any]:
+    elements = generate_elements(size)
+    sc_set = ScNumberedSet(*elements)
+    return lambda: sc_set.remove(elements[0])
+
+
+CASES = [
+    Case("set_build", set_build, 100_000),
+    Case("set_iterate", set_iterate, 100_000),
+    Case("set_contains", set_contains, 100_000),
+    Case("oriented_set_append", oriented_set_append, 1_000),
+    Case("oriented_set_iterate", oriented_set_iterate, 1_000),
+    Case("numbered_set_add", numbered_set_add, 100_000),
+    Case("numbered_set_remove", numbered_set_remove, 100_000),
+]
+
+
+class BenchmarkAgent(ScAgentClassic):
+    condition = threading.Condition()
+    finished_count = 0
+
+    def on_event(self, event_element: ScAddr, event_connector: ScAddr, action_element: ScAddr) -> ScResult:
+        finish_action_with_status(action_element, True)
+        with self.condition:
+            BenchmarkAgent.finished_count += 1
+            self.condition.notify_all()
+        return ScResult.OK
+
+    @classmethod
+    def wait_finished(cls, count: int, timeout: float) -> bool:
+        """Wait until count actions are finished since the last wait"""
+        with cls.condition:
+            is_finished = cls.condition.wait_for(lambda: cls.finished_count >= count, timeout)
+            cls.finished_count = 0
+        return is_finished
+
+
+def measure(run: Callable[[], Any]) -> Dict[str, Any]:
+    with ScTracer(all_threads=True) as tracer:
+        start = time.perf_counter()
+        run()
+        wall_time = time.perf_counter() - start
+    return {"wall_time": wall_time, "round_trips": tracer.round_trips}
+
+
+def is_selected(name: str, name_filter: str) -> bool:
+    """Filter is a substring of names of cases to run, the empty one selects all cases"""
+    return name_filter in name
+
+
+def run_cases(sizes: List[int], name_filter: str) -> Iterator[Dict[str, Any]]:
+    for case in CASES:
+        if not is_selected(case.name, name_filter):
+            continue
+        for size in sizes:
+            if size <= case.max_size:
+                yield {"case": case.name, "size": size, **measure(case.setup(size))}
+
+
+def run_actions(server: ScServer, actions_count: int) -> Iterator[Dict[str, Any]]:
+    """Measure latency of sequential call and wait of actions"""
+    module = ScModule(BenchmarkAgent("benchmark_action"))
+    server.add_modules(module)
+    with server.register_modules():
+        result = measure(
+            lambda: [execute_agent({}, [CommonIdentifiers.ACTION, "benchmark_action"]) for _ in range(actions_count)]
+        )
+    server.remove_modules(module)
+    yield {"case": "action_execute", "size": actions_count, **result, "latency": result["wall_time"] / actions_count}
+
+
+def dispatch(agents_count: int, actions_count: int) -> None:
+    for index in range(actions_count):
+        call_agent({}, [CommonIdentifiers.ACTION, f"benchmark_action_{index % agents_count}"])
+    if not BenchmarkAgent.wait_finished(actions_count, timeout=30):
+        raise TimeoutError("Actions weren't finished")
+
+
+def run_dispatch(server: ScServer, agents_counts: List[int], actions_count: int) -> Iterator[Dict[str, Any]]:
+    """Measure throughput of actions which are called at once and dispatched to agents of different classes"""
+    for agents_count in agents_counts:
+        module = ScModule(*(BenchmarkAgent(f"benchmark_action_{index}") for index in range(agents_count)))
+        server.add_modules(module)
+        with server.register_modules():
+            result = measure(partial(dispatch, agents_count, actions_count))
+        server.remove_modules(module)
+        yield {
+            "case": "agents_dispatch",
+            "size": actions_count,
+            "agents": agents_count,
+            **result,
+            "throughput": actions_count / result["wall_time"],
+        }
+
+
+def main(url: str, sizes: List[int], agents_counts: List[int], actions_count: int, name_filter: str) -> Dict[str, Any]:
+    server = ScServer(url)
+    results: List[Dict[str, Any]] = []
+    with server.connect():
+        results.extend(run_cases(sizes, name_filter))
+        if is_selected("action_execute", name_filter):
+            results.extend(run_actions(server, actions_count))
+        if is_selected("agents_dispatch", name_filter):
+            results.extend(run_dispatch(server, agents_counts, actions_count))
+    for result in results:
+        name = f"{result['case']}[{result['agents']}]" if "agents" in result else result["case"]
+        print(
+            f"{name:<24} {result['size']:>8} {result['wall_time'] * 1000:12.2f} ms "
+            f"{result['round_trips']:>8} round trips",
+            file=sys.stderr,
+        )
+    return {
+        "url": url,
+        "python": platform.python_version(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+
+
+def parse_ints(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="memory://?latency=0.001", help="sc-server url or memory:// with latency")
+    parser.add_argument("--sizes", type=parse_ints, default=[10, 100, 1000, 10000, 100000], help="sizes of sets")
+    parser.add_argument("--agents", type=parse_ints, default=[1, 10, 50], help="numbers of agents for dispatch")
+    parser.add_argument("--actions", type=int, default=100, help="number of actions for action cases")
+    parser.add_argument("--filter", default="", help="substring of names of cases to run")
+    parser.add_argument("--output", default=None, help="path to the JSON file, stdout by default")
+    args = parser.parse_args()
+    report = main(args.url, args.sizes, args.agents, args.actions, args.filter)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
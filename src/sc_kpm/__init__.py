@@ -6,8 +6,10 @@ Distributed under the MIT License
 
 from sc_kpm import utils
 from sc_kpm.logging import set_root_config
-from sc_kpm.sc_agent import ScAgent, ScAgentClassic
-from sc_kpm.sc_keynodes import ScKeynodes
+from sc_kpm.sc_agent import AsyncScAgent, AsyncScAgentClassic, ScAgent, ScAgentClassic
+from sc_kpm.sc_agent_executor import OverflowPolicy, ScAgentExecutor, ScProcessExecutor
+from sc_kpm.sc_agent_profiler import ScAgentProfiler
+from sc_kpm.sc_keynodes import ScKeynode, ScKeynodes, ScKeynodesContainer
 from sc_kpm.sc_module import ScModule
 from sc_kpm.sc_result import ScResult
 from sc_kpm.sc_server import ScServer
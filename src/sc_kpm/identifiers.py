@@ -69,8 +69,5 @@ class _IdentifiersResolver:
             ActionStatus.ACTION_FINISHED_SUCCESSFULLY: sc_type.CONST_NODE_CLASS,
             ActionStatus.ACTION_FINISHED_UNSUCCESSFULLY: sc_type.CONST_NODE_CLASS,
         }
-
-        for idtf, type_value in types_map.items():
-            ScKeynodes.resolve(idtf, type_value)
-
+        ScKeynodes.prefetch(types_map)
         cls.is_resolved = True
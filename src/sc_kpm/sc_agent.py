@@ -4,59 +4,146 @@ Distributed under the MIT License
 (See an accompanying file LICENSE or a copy at https://opensource.org/licenses/MIT)
 """
 
+import asyncio
+import itertools
+import threading
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
 from logging import getLogger
-from typing import Optional, Union
+from typing import Any, Callable, Coroutine, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
 
 from sc_client import client
 from sc_client.constants import sc_type
 from sc_client.constants.common import ScEventType
 from sc_client.constants.exceptions import InvalidValueError
-from sc_client.models import ScAddr, ScEventSubscription, ScEventSubscriptionParams
+from sc_client.constants.sc_type import ScType
+from sc_client.models import ScAddr, ScEventSubscription, ScEventSubscriptionParams, ScTemplate
 
-from sc_kpm.identifiers import ActionStatus
+from sc_kpm.identifiers import ActionStatus, CommonIdentifiers, ScAlias
+from sc_kpm.sc_agent_executor import DoneCallback, EventHandler, ScAgentExecutor
+from sc_kpm.sc_agent_metrics import EventTimer, ScAgentMetrics, ScEventMeasurement, measure
+from sc_kpm.sc_agent_profiler import ScAgentProfiler
 from sc_kpm.sc_keynodes import Idtf, ScKeynodes
 from sc_kpm.sc_result import ScResult
-from sc_kpm.utils.action_utils import check_action_class
 
 
 class ScAgentAbstract(ABC):
+    is_cpu_bound: bool = False  # Agent is run by the process executor of the module
+
     def __init__(self, event_element: ScAddr, event_type: ScEventType) -> None:
         self._event_element = event_element
         self._event_type = event_type
         self._event: Optional[ScEventSubscription] = None
+        self._executor: Optional[ScAgentExecutor] = None
+        self._metrics = ScAgentMetrics()
+        self._profiler: Optional[ScAgentProfiler] = None
         self.logger = getLogger(f"{self.__module__}.{self.__class__.__name__}")
 
     @abstractmethod
     def __repr__(self) -> str:
         pass
 
+    def __getstate__(self) -> Dict[str, Any]:
+        # Agent is pickled to worker processes without subscription, executor, metrics and profiler
+        state = self.__dict__.copy()
+        state["_event"] = None
+        state["_executor"] = None
+        state["_metrics"] = None
+        state["_profiler"] = None
+        return state
+
     def _register(self) -> None:
-        if self._event is not None:
-            self.logger.warning("Almost registered")
-            return
-        event_params = ScEventSubscriptionParams(self._event_element, self._event_type, self._callback)
-        self._event = client.create_elementary_event_subscriptions(event_params)[0]
-        self.logger.info(
-            "Registered with ScEvent: %s - %s",
-            repr(self._event_element),
-            repr(self._event_type),
-        )
+        _register_agents(self)
 
     def _unregister(self) -> None:
-        if self._event is None:
-            self.logger.warning("ScEvent was already destroyed or not registered")
-            return
-        client.destroy_elementary_event_subscriptions(self._event)
-        self._event = None
-        self.logger.info(
-            "Unregistered ScEvent: %s - %s",
-            repr(self._event_element),
-            repr(self._event_type),
-        )
+        _unregister_agents(self)
+
+    def _get_keynodes_types(self) -> Dict[Idtf, ScType]:
+        """Get types of keynodes of the agent given by identifiers"""
+        return {}
+
+    def _set_keynodes(self, keynodes: Dict[Idtf, ScAddr]) -> None:
+        """Set keynodes of the agent given by identifiers"""
+
+    @property
+    def executor(self) -> Optional[ScAgentExecutor]:
+        return self._executor
+
+    def set_executor(self, executor: Optional[ScAgentExecutor]) -> None:
+        """Handle events in the worker pool of the executor or in the event threads if it is None"""
+        self._executor = executor
+
+    @property
+    def profiler(self) -> Optional[ScAgentProfiler]:
+        return self._profiler
+
+    def set_profiler(self, profiler: Optional[ScAgentProfiler]) -> None:
+        """
+        Profile activations of the agent or disable profiling if it is None.
+        Activations of async agents are profiled if they aren't run on the loop of ScServer.serve_async.
+        """
+        self._profiler = profiler
+
+    @property
+    def metrics(self) -> ScAgentMetrics:
+        """Counters of events and results, latencies and time of requests to the sc-server"""
+        return self._metrics
 
     def _callback(self, event_element: ScAddr, event_connector: ScAddr, action_element: ScAddr) -> ScResult:
-        return self.on_event(event_element, event_connector, action_element)
+        return self._execute(event_element, event_connector, action_element)
+
+    def _execute(
+        self,
+        event_element: ScAddr,
+        event_connector: ScAddr,
+        action_element: ScAddr,
+        default_executor: Optional[ScAgentExecutor] = None,
+    ) -> ScResult:
+        """Track and handle the event in the executor of the agent, in the default one or in the calling thread"""
+        self._metrics.record_event()
+        finish_tracking = _InFlightEvents.add(self, action_element)
+        if finish_tracking is None:
+            self.logger.debug("Skipped event: agents are draining")
+            self._metrics.record(ScEventMeasurement(ScResult.SKIP))
+            return ScResult.SKIP
+        finish = partial(self._finish_event, finish_tracking)
+        executor = self._executor if self._executor is not None else default_executor
+        return self._dispatch(finish, executor, event_element, event_connector, action_element)
+
+    def _finish_event(self, finish_tracking: Callable[[], None], measurement: Optional[ScEventMeasurement]) -> None:
+        finish_tracking()
+        self._metrics.record(measurement)
+
+    def _dispatch(
+        self,
+        finish: DoneCallback,
+        executor: Optional[ScAgentExecutor],
+        event_element: ScAddr,
+        event_connector: ScAddr,
+        action_element: ScAddr,
+    ) -> ScResult:
+        handler = self._profile(self.on_event)
+        if executor is None:
+            measurement = None
+            try:
+                measurement = measure(handler, event_element, event_connector, action_element)
+            finally:
+                finish(measurement)
+            return measurement.result
+        return executor.submit(handler, event_element, event_connector, action_element, on_done=finish)
+
+    def _profile(self, handler: EventHandler) -> EventHandler:
+        if self._profiler is None:
+            return handler
+        return partial(self._run_profiled, handler)
+
+    def _run_profiled(self, handler: Callable[..., ScResult], *args: Any) -> ScResult:
+        if self._profiler is None:  # Agent in the worker process
+            return handler(*args)
+        agent_class = f"{self.__class__.__module__}.{self.__class__.__name__}"
+        return self._profiler.profile(agent_class, handler, *args)
 
     @abstractmethod
     def on_event(self, event_element: ScAddr, event_connector: ScAddr, action_element: ScAddr) -> ScResult:
@@ -65,6 +152,7 @@ class ScAgentAbstract(ABC):
 
 class ScAgent(ScAgentAbstract, ABC):
     def __init__(self, event_element: Union[Idtf, ScAddr], event_type: ScEventType) -> None:
+        self._event_element_idtf = event_element if isinstance(event_element, Idtf) else None
         if isinstance(event_element, Idtf):
             event_element = ScKeynodes.resolve(event_element, sc_type.CONST_NODE_CLASS)
         if not event_element.is_valid():
@@ -72,6 +160,15 @@ class ScAgent(ScAgentAbstract, ABC):
             raise InvalidValueError(f"event_class of {self.__class__.__name__} is invalid")
         super().__init__(event_element, event_type)
 
+    def _get_keynodes_types(self) -> Dict[Idtf, ScType]:
+        if self._event_element_idtf is None:
+            return {}
+        return {self._event_element_idtf: sc_type.CONST_NODE_CLASS}
+
+    def _set_keynodes(self, keynodes: Dict[Idtf, ScAddr]) -> None:
+        if self._event_element_idtf is not None:
+            self._event_element = keynodes[self._event_element_idtf]
+
     def __repr__(self) -> str:
         return f"ScAgent(event_class='{self._event_element}', event_type={repr(self._event_type)})"
 
@@ -83,6 +180,10 @@ class ScAgentClassic(ScAgent, ABC):
         event_element: Union[Idtf, ScAddr] = ActionStatus.ACTION_INITIATED,
         event_type: ScEventType = ScEventType.AFTER_GENERATE_OUTGOING_ARC,
     ) -> None:
+        keynodes = {action_class_name: sc_type.CONST_NODE_CLASS}
+        if isinstance(event_element, Idtf):
+            keynodes[event_element] = sc_type.CONST_NODE_CLASS
+        ScKeynodes.prefetch(keynodes)
         super().__init__(event_element, event_type)
         self._action_class_name = action_class_name
         self._action_class = ScKeynodes.resolve(action_class_name, sc_type.CONST_NODE_CLASS)
@@ -95,8 +196,352 @@ class ScAgentClassic(ScAgent, ABC):
             description = f"{description}, event_type={repr(self._event_type)}"
         return description + ")"
 
-    def _callback(self, event_element: ScAddr, event_connector: ScAddr, action_element: ScAddr) -> ScResult:
-        if not check_action_class(self._action_class, action_element):
-            return ScResult.SKIP
+    def _get_keynodes_types(self) -> Dict[Idtf, ScType]:
+        return {**super()._get_keynodes_types(), self._action_class_name: sc_type.CONST_NODE_CLASS}
+
+    def _set_keynodes(self, keynodes: Dict[Idtf, ScAddr]) -> None:
+        super()._set_keynodes(keynodes)
+        self._action_class = keynodes[self._action_class_name]
+
+    def _confirmed_callback(
+        self,
+        event_element: ScAddr,
+        event_connector: ScAddr,
+        action_element: ScAddr,
+        default_executor: Optional[ScAgentExecutor] = None,
+    ) -> ScResult:
         self.logger.info("Confirmed action class")
-        return self.on_event(event_element, event_connector, action_element)
+        return self._execute(event_element, event_connector, action_element, default_executor)
+
+
+class _InFlightEvents:
+    """Events which are being handled by agents, ScServer waits for events of its agents before disconnect"""
+
+    condition = threading.Condition()
+    _draining_agents: Set[ScAgentAbstract] = set()
+    _events: Dict[int, Tuple[ScAgentAbstract, ScAddr]] = {}
+    _keys = itertools.count()
+
+    @classmethod
+    def add(cls, agent: ScAgentAbstract, action_element: ScAddr) -> Optional[Callable[[], None]]:
+        """Start tracking of the event, return function to finish it or None if events of the agent aren't accepted"""
+        with cls.condition:
+            if agent in cls._draining_agents:
+                return None
+            key = next(cls._keys)
+            cls._events[key] = (agent, action_element)
+        return partial(cls._remove, key)
+
+    @classmethod
+    def accept(cls, agents: Iterable[ScAgentAbstract]) -> None:
+        """Accept new events of drained agents again"""
+        with cls.condition:
+            cls._draining_agents.difference_update(agents)
+
+    @classmethod
+    def drain(cls, agents: Iterable[ScAgentAbstract], timeout: Optional[float]) -> List[Tuple[ScAgentAbstract, ScAddr]]:
+        """
+        Stop accepting of new events of agents, wait for their handled ones
+        and return events which are unfinished on timeout. Events of other agents are still accepted.
+        """
+        agents = set(agents)
+
+        def get_events() -> List[Tuple[ScAgentAbstract, ScAddr]]:
+            return [(agent, action_element) for agent, action_element in cls._events.values() if agent in agents]
+
+        with cls.condition:
+            cls._draining_agents |= agents
+            cls.condition.wait_for(lambda: not get_events(), timeout)
+            return get_events()
+
+    @classmethod
+    def _remove(cls, key: int) -> None:
+        with cls.condition:
+            cls._events.pop(key, None)
+            cls.condition.notify_all()
+
+
+_RouteKey = Tuple[ScAddr, ScEventType]
+
+
+class _ActionRouter:
+    """
+    Router of events to ScAgentClassic objects.
+    It keeps one subscription for each event element and event type, searches classes of the action once
+    and calls only agents of these classes.
+    """
+
+    lock = threading.RLock()
+    max_workers = 8  # Workers of the pool for agents without executors which share the event with other agents
+    _subscriptions: Dict[_RouteKey, ScEventSubscription] = {}
+    _agents: Dict[_RouteKey, Dict[ScAddr, Set[ScAgentClassic]]] = {}
+    _executor: Optional[ScAgentExecutor] = None
+    logger = getLogger(f"{__name__}.ActionRouter")
+
+    @classmethod
+    def get_missing_params(cls, agents: List[ScAgentClassic]) -> Dict[_RouteKey, ScEventSubscriptionParams]:
+        """Get params of subscriptions which are needed for agents, it must be called with the lock"""
+        keys = {(agent._event_element, agent._event_type) for agent in agents}  # pylint: disable=protected-access
+        return {
+            key: ScEventSubscriptionParams(*key, partial(cls._route, key)) for key in keys - cls._subscriptions.keys()
+        }
+
+    @classmethod
+    def add_agents(cls, agents: List[ScAgentClassic], subscriptions: Dict[_RouteKey, ScEventSubscription]) -> None:
+        """Add agents and created subscriptions, it must be called with the lock"""
+        # pylint: disable=protected-access
+        for key, subscription in subscriptions.items():
+            cls._subscriptions[key] = subscription
+            cls._agents[key] = {}
+            cls.logger.debug("Subscribed to ScEvent: %s - %s", repr(key[0]), repr(key[1]))
+        for agent in agents:
+            key = (agent._event_element, agent._event_type)
+            cls._agents[key].setdefault(agent._action_class, set()).add(agent)
+            agent._event = cls._subscriptions[key]
+
+    @classmethod
+    def remove_agents(cls, agents: List[ScAgentClassic]) -> List[ScEventSubscription]:
+        """Remove agents and return subscriptions without agents to destroy, it must be called with the lock"""
+        # pylint: disable=protected-access
+        unused_subscriptions = []
+        for agent in agents:
+            key = (agent._event_element, agent._event_type)
+            class_agents = cls._agents.get(key, {})
+            agents_of_class = class_agents.get(agent._action_class)
+            if agents_of_class is not None:
+                agents_of_class.discard(agent)
+                if not agents_of_class:
+                    del class_agents[agent._action_class]
+            if key in cls._subscriptions and not class_agents:
+                unused_subscriptions.append(cls._subscriptions.pop(key))
+                del cls._agents[key]
+                cls.logger.debug("Unsubscribed from ScEvent: %s - %s", repr(key[0]), repr(key[1]))
+        return unused_subscriptions
+
+    @classmethod
+    def _route(cls, key: _RouteKey, event_element: ScAddr, event_connector: ScAddr, action_element: ScAddr) -> ScResult:
+        if not cls._agents.get(key):
+            return ScResult.SKIP
+        templ = ScTemplate()
+        templ.triple(sc_type.VAR_NODE >> ScAlias.ELEMENT, sc_type.VAR_PERM_POS_ARC, action_element)
+        action_classes = {result.get(ScAlias.ELEMENT) for result in client.search_by_template(templ)}
+        if ScKeynodes[CommonIdentifiers.ACTION] not in action_classes:
+            action_classes = set()
+        with cls.lock:
+            class_agents = cls._agents.get(key, {})
+            agents = [agent for action_class in action_classes for agent in class_agents.get(action_class, ())]
+            skipping_agents = [
+                agent
+                for action_class, agents_of_class in class_agents.items()
+                if action_class not in action_classes
+                for agent in agents_of_class
+            ]
+        for agent in skipping_agents:
+            agent._metrics.record_event()  # pylint: disable=protected-access
+            agent._metrics.record(ScEventMeasurement(ScResult.SKIP))  # pylint: disable=protected-access
+        if not agents:
+            return ScResult.SKIP
+        # Other agents are handed off to their executors or to the bounded pool of the router,
+        # so they don't wait for each other as they were called with own subscriptions
+        for agent in agents[1:]:
+            agent._confirmed_callback(  # pylint: disable=protected-access
+                event_element, event_connector, action_element, cls._get_executor()
+            )
+        return agents[0]._confirmed_callback(  # pylint: disable=protected-access
+            event_element, event_connector, action_element
+        )
+
+    @classmethod
+    def _get_executor(cls) -> ScAgentExecutor:
+        with cls.lock:
+            if cls._executor is None:
+                cls._executor = ScAgentExecutor(max_workers=cls.max_workers)
+            return cls._executor
+
+
+def _register_agents(*agents: ScAgentAbstract) -> None:
+    """Create subscriptions of agents in one request, ScAgentClassic objects share subscriptions of the router"""
+    # pylint: disable=protected-access
+    unregistered_agents = []
+    for agent in agents:
+        if agent._event is not None:
+            agent.logger.warning("Almost registered")
+        else:
+            unregistered_agents.append(agent)
+    classic_agents = [agent for agent in unregistered_agents if isinstance(agent, ScAgentClassic)]
+    other_agents = [agent for agent in unregistered_agents if not isinstance(agent, ScAgentClassic)]
+    with _ActionRouter.lock:
+        route_params = _ActionRouter.get_missing_params(classic_agents)
+        params = [
+            *(
+                ScEventSubscriptionParams(agent._event_element, agent._event_type, agent._callback)
+                for agent in other_agents
+            ),
+            *route_params.values(),
+        ]
+        subscriptions = client.create_elementary_event_subscriptions(*params) if params else []
+        for agent, subscription in zip(other_agents, subscriptions):
+            agent._event = subscription
+        _ActionRouter.add_agents(classic_agents, dict(zip(route_params, subscriptions[len(other_agents) :])))
+    for agent in unregistered_agents:
+        agent.logger.info("Registered with ScEvent: %s - %s", repr(agent._event_element), repr(agent._event_type))
+
+
+def _resolve_agents_keynodes(*agents: ScAgentAbstract) -> None:
+    """Resolve keynodes of unregistered agents given by identifiers in one request, e.g. after reconnection"""
+    # pylint: disable=protected-access
+    types_map: Dict[Idtf, ScType] = {}
+    for agent in agents:
+        types_map.update(agent._get_keynodes_types())
+    if not types_map:
+        return
+    keynodes = ScKeynodes.prefetch(types_map)
+    for agent in agents:
+        agent._set_keynodes(keynodes)
+
+
+_is_connection_lost: ContextVar[bool] = ContextVar("sc_kpm_is_connection_lost", default=False)
+
+
+@contextmanager
+def _forgetting_subscriptions() -> Iterator[None]:
+    """Agents unregistered in the block forget subscriptions without requests, they were destroyed with connection"""
+    token = _is_connection_lost.set(True)
+    try:
+        yield
+    finally:
+        _is_connection_lost.reset(token)
+
+
+def _unregister_agents(*agents: ScAgentAbstract, is_connection_lost: bool = False) -> None:
+    """Destroy subscriptions of agents in one request, they are only forgotten if the connection was lost"""
+    # pylint: disable=protected-access
+    is_connection_lost = is_connection_lost or _is_connection_lost.get()
+    registered_agents = []
+    for agent in agents:
+        if agent._event is None:
+            agent.logger.warning("ScEvent was already destroyed or not registered")
+        else:
+            registered_agents.append(agent)
+    with _ActionRouter.lock:
+        subscriptions = [agent._event for agent in registered_agents if not isinstance(agent, ScAgentClassic)]
+        subscriptions += _ActionRouter.remove_agents(
+            [agent for agent in registered_agents if isinstance(agent, ScAgentClassic)]
+        )
+        if subscriptions and client.is_connected() and not is_connection_lost:
+            client.destroy_elementary_event_subscriptions(*subscriptions)
+        for agent in registered_agents:
+            agent._event = None
+    for agent in registered_agents:
+        agent.logger.info("Unregistered ScEvent: %s - %s", repr(agent._event_element), repr(agent._event_type))
+
+
+class _AsyncEventLoop:
+    """Event loop of ScServer.serve_async, coroutines of async agents are run as its tasks"""
+
+    loop: Optional[asyncio.AbstractEventLoop] = None
+    semaphore: Optional[asyncio.Semaphore] = None
+    tasks: Set["asyncio.Task[ScResult]"] = set()
+
+    @classmethod
+    def start(cls, max_concurrent_events: int) -> None:
+        cls.loop = asyncio.get_running_loop()
+        cls.semaphore = asyncio.Semaphore(max_concurrent_events)
+
+    @classmethod
+    async def stop(cls) -> None:
+        cls.loop = None
+        if cls.tasks:
+            await asyncio.gather(*cls.tasks, return_exceptions=True)
+        cls.semaphore = None
+
+    @classmethod
+    def run(cls, coroutine_function: Callable[..., Coroutine[Any, Any, ScResult]], *args: ScAddr) -> bool:
+        """Schedule the coroutine from the event thread, return False if the loop isn't running"""
+        loop = cls.loop
+        if loop is None or loop.is_closed():
+            return False
+        loop.call_soon_threadsafe(cls._create_task, coroutine_function(*args))
+        return True
+
+    @classmethod
+    def _create_task(cls, coroutine: Coroutine[Any, Any, ScResult]) -> None:
+        task = asyncio.ensure_future(cls._limit(coroutine))
+        cls.tasks.add(task)
+        task.add_done_callback(cls.tasks.discard)
+
+    @classmethod
+    async def _limit(cls, coroutine: Coroutine[Any, Any, ScResult]) -> ScResult:
+        semaphore = cls.semaphore
+        if semaphore is None:
+            return await coroutine
+        await semaphore.acquire()  # Pylint infers None of the class attribute in async with even after the check
+        try:
+            return await coroutine
+        finally:
+            semaphore.release()
+
+
+class _AsyncAgentMixin(ScAgentAbstract, ABC):
+    """Agent with coroutine on_event which is run on the loop of ScServer.serve_async or in the event thread"""
+
+    def _dispatch(
+        self,
+        finish: DoneCallback,
+        executor: Optional[ScAgentExecutor],
+        event_element: ScAddr,
+        event_connector: ScAddr,
+        action_element: ScAddr,
+    ) -> ScResult:
+        if _AsyncEventLoop.run(partial(self._run, finish), event_element, event_connector, action_element):
+            return ScResult.UNKNOWN
+        if executor is None:
+            return self._profile(self._run_sync)(event_element, event_connector, action_element, finish)
+        return executor.submit(
+            self._profile(self._run_sync), event_element, event_connector, action_element, on_done=finish
+        )
+
+    def _run_sync(
+        self,
+        event_element: ScAddr,
+        event_connector: ScAddr,
+        action_element: ScAddr,
+        finish: Optional[DoneCallback] = None,
+    ) -> ScResult:
+        return asyncio.run(self._run(finish, event_element, event_connector, action_element))
+
+    async def _run(
+        self,
+        finish: Optional[DoneCallback],
+        event_element: ScAddr,
+        event_connector: ScAddr,
+        action_element: ScAddr,
+    ) -> ScResult:
+        measurement = None
+        try:
+            with EventTimer() as timer:
+                result = await self.on_event(event_element, event_connector, action_element)
+            measurement = ScEventMeasurement(result, timer.duration, timer.kb_time)
+            return result
+        except Exception:  # pylint: disable=broad-exception-caught
+            self.logger.exception("Failed to handle event")
+            return ScResult.ERROR
+        finally:
+            if finish is not None:
+                finish(measurement)
+
+    @abstractmethod
+    async def on_event(  # pylint: disable=invalid-overridden-method
+        self, event_element: ScAddr, event_connector: ScAddr, action_element: ScAddr
+    ) -> ScResult:
+        pass
+
+
+class AsyncScAgent(_AsyncAgentMixin, ScAgent, ABC):
+    def __repr__(self) -> str:
+        return f"AsyncScAgent(event_class='{self._event_element}', event_type={repr(self._event_type)})"
+
+
+class AsyncScAgentClassic(_AsyncAgentMixin, ScAgentClassic, ABC):
+    def __repr__(self) -> str:
+        return "Async" + super().__repr__()
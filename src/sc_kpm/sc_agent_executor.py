@@ -0,0 +1,266 @@
+"""
+This source file is part of an OSTIS project. For the latest info, see https://github.com/ostis-ai
+Distributed under the MIT License
+(See an accompanying file LICENSE or a copy at https://opensource.org/licenses/MIT)
+"""
+
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from enum import Enum
+from logging import getLogger
+from multiprocessing.context import BaseContext
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from sc_client import client
+from sc_client.models import ScAddr
+
+from sc_kpm.identifiers import _IdentifiersResolver
+from sc_kpm.sc_agent_metrics import ScEventMeasurement, measure
+from sc_kpm.sc_keynodes import Idtf, ScKeynodes
+from sc_kpm.sc_memory import ScMemoryListener, ScMemoryStandIn, _ScMemoryClient
+from sc_kpm.sc_result import ScResult
+
+EventHandler = Callable[[ScAddr, ScAddr, ScAddr], ScResult]
+DoneCallback = Callable[[Optional[ScEventMeasurement]], None]
+
+
+class OverflowPolicy(Enum):
+    BLOCK = "block"  # wait for the place in the queue
+    DROP = "drop"  # skip the event silently
+    REJECT = "reject"  # skip the event with the warning and the reject result
+
+
+class ScAgentExecutorInfo(NamedTuple):
+    workers: int
+    queue_depth: int
+    submitted: int
+    completed: int
+    failed: int
+    dropped: int
+    rejected: int
+    total_wait_time: float
+    max_wait_time: float
+
+
+_Task = Tuple[EventHandler, Tuple[ScAddr, ScAddr, ScAddr], float, Optional[DoneCallback]]
+
+
+class ScAgentExecutor:
+    """
+    Bounded pool of worker threads for agents events.
+    Events are handed off to the queue, so agents work doesn't block threads of the sc-client.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 4,
+        max_queue_size: int = 0,
+        overflow_policy: OverflowPolicy = OverflowPolicy.BLOCK,
+        reject_result: ScResult = ScResult.ERROR,
+    ) -> None:
+        """
+        Initialize ScAgentExecutor.
+
+        :param max_workers: Number of worker threads, they are started on the first event.
+        :param max_queue_size: Max number of waiting events, 0 means unbounded queue.
+        :param overflow_policy: What to do with the event if the queue is full.
+        :param reject_result: Result of the callback if the event is rejected.
+        """
+        if max_workers < 1:
+            raise ValueError("Executor must have at least one worker")
+        self._max_workers = max_workers
+        self._overflow_policy = overflow_policy
+        self._reject_result = reject_result
+        self._queue: "queue.Queue[Optional[_Task]]" = queue.Queue(max_queue_size)
+        self._workers: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._dropped = 0
+        self._rejected = 0
+        self._total_wait_time = 0.0
+        self._max_wait_time = 0.0
+        self.logger = getLogger(f"{self.__module__}.{self.__class__.__name__}")
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(max_workers={self._max_workers}, max_queue_size={self._queue.maxsize}, "
+            f"overflow_policy={self._overflow_policy})"
+        )
+
+    def submit(self, handler: EventHandler, *event: ScAddr, on_done: Optional[DoneCallback] = None) -> ScResult:
+        """
+        Put the event to the queue, ScResult.UNKNOWN means that it is accepted.
+        on_done is called with the measurement after handling of the event (None if the handler raised an exception)
+        or immediately if the event isn't accepted.
+        """
+        self._start_workers()
+        task = (handler, event, time.monotonic(), on_done)
+        try:
+            if self._overflow_policy is OverflowPolicy.BLOCK:
+                self._queue.put(task)
+            else:
+                self._queue.put_nowait(task)
+        except queue.Full:
+            with self._lock:
+                if self._overflow_policy is OverflowPolicy.DROP:
+                    self._dropped += 1
+                    result = ScResult.SKIP
+                else:
+                    self._rejected += 1
+                    result = self._reject_result
+            if result is ScResult.SKIP:
+                self.logger.debug("Dropped event of %s: queue is full", repr(handler))
+            else:
+                self.logger.warning("Rejected event of %s: queue is full", repr(handler))
+            if on_done is not None:
+                on_done(ScEventMeasurement(result))
+            return result
+        with self._lock:
+            self._submitted += 1
+        return ScResult.UNKNOWN
+
+    def info(self) -> ScAgentExecutorInfo:
+        """Get queue depth, counters of events and time that events waited in the queue"""
+        with self._lock:
+            return ScAgentExecutorInfo(
+                workers=len(self._workers),
+                queue_depth=self._queue.qsize(),
+                submitted=self._submitted,
+                completed=self._completed,
+                failed=self._failed,
+                dropped=self._dropped,
+                rejected=self._rejected,
+                total_wait_time=self._total_wait_time,
+                max_wait_time=self._max_wait_time,
+            )
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop workers after processing of queued events"""
+        with self._lock:
+            workers, self._workers = self._workers, []
+        for _ in workers:
+            self._queue.put(None)
+        if wait:
+            for worker in workers:
+                worker.join()
+        self.logger.info("Shut down %d workers", len(workers))
+
+    def _handle(self, handler: EventHandler, event: Tuple[ScAddr, ScAddr, ScAddr]) -> ScEventMeasurement:
+        return measure(handler, *event)
+
+    def _start_workers(self) -> None:
+        if self._workers:
+            return
+        with self._lock:
+            if self._workers:
+                return
+            for index in range(self._max_workers):
+                worker = threading.Thread(target=self._work, name=f"sc-agent-worker-{index}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def _work(self) -> None:
+        while (task := self._queue.get()) is not None:
+            handler, event, submit_time, on_done = task
+            wait_time = time.monotonic() - submit_time
+            with self._lock:
+                self._total_wait_time += wait_time
+                self._max_wait_time = max(self._max_wait_time, wait_time)
+            measurement = None
+            try:
+                measurement = self._handle(handler, event)
+            except Exception:  # pylint: disable=broad-exception-caught
+                self.logger.exception("Failed to handle event by %s", repr(handler))
+            finally:
+                if on_done is not None:
+                    on_done(measurement)
+            is_failed = measurement is None
+            with self._lock:
+                self._completed += 1
+                self._failed += is_failed
+
+
+class ScProcessExecutor(ScAgentExecutor):
+    """
+    Executor which handles events in worker processes, it is used for CPU-bound agents.
+    Each process has own connection to the sc-server and keynodes resolved by the parent before the first event.
+    Agents are pickled to processes without subscriptions and executors,
+    so their classes must be importable (defined at the module level).
+    Workers of the url memory:// send requests to the sc-memory stand-in of the parent process,
+    they can't subscribe to events.
+    """
+
+    def __init__(
+        self,
+        sc_server_url: str,
+        max_workers: int = multiprocessing.cpu_count(),
+        max_queue_size: int = 0,
+        overflow_policy: OverflowPolicy = OverflowPolicy.BLOCK,
+        reject_result: ScResult = ScResult.ERROR,
+        mp_context: Optional[BaseContext] = None,
+    ) -> None:
+        """
+        Initialize ScProcessExecutor.
+
+        :param sc_server_url: Url of the sc-server websocket for worker processes.
+        :param max_workers: Number of worker processes, they are started on the first event.
+        :param max_queue_size: Max number of waiting events, 0 means unbounded queue.
+        :param overflow_policy: What to do with the event if the queue is full.
+        :param reject_result: Result of the callback if the event is rejected.
+        :param mp_context: Multiprocessing context of worker processes, spawn by default.
+        """
+        super().__init__(max_workers, max_queue_size, overflow_policy, reject_result)
+        self._url = sc_server_url
+        self._mp_context = mp_context or multiprocessing.get_context("spawn")
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._memory_listener: Optional[ScMemoryListener] = None
+
+    def shutdown(self, wait: bool = True) -> None:
+        super().shutdown(wait)
+        with self._lock:
+            pool, self._pool = self._pool, None
+            memory_listener, self._memory_listener = self._memory_listener, None
+        if pool is not None:
+            pool.shutdown(wait)
+        if memory_listener is not None:
+            memory_listener.close()
+
+    def _handle(self, handler: EventHandler, event: Tuple[ScAddr, ScAddr, ScAddr]) -> ScEventMeasurement:
+        pool = self._pool
+        if pool is None:
+            raise RuntimeError("Process pool is shut down")
+        return pool.submit(measure, handler, *event).result()
+
+    def _start_workers(self) -> None:
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    keynodes = dict(ScKeynodes._dict)  # pylint: disable=protected-access
+                    memory_address = None
+                    if ScMemoryStandIn.is_memory_url(self._url):
+                        self._memory_listener = ScMemoryStandIn.from_url(self._url).listen()
+                        memory_address = (self._memory_listener.address, self._memory_listener.authkey)
+                    self._pool = ProcessPoolExecutor(
+                        self._max_workers,
+                        mp_context=self._mp_context,
+                        initializer=_initialize_process,
+                        initargs=(self._url, {idtf: addr.value for idtf, addr in keynodes.items()}, memory_address),
+                    )
+        super()._start_workers()
+
+
+def _initialize_process(
+    sc_server_url: str, keynodes: Dict[Idtf, int], memory_address: Optional[Tuple[Any, bytes]]
+) -> None:
+    if memory_address is not None:
+        _ScMemoryClient(*memory_address).install()
+    client.connect(sc_server_url)
+    # pylint: disable=protected-access
+    with ScKeynodes._lock:
+        ScKeynodes._add({idtf: ScAddr(value) for idtf, value in keynodes.items()})
+    _IdentifiersResolver.is_resolved = True
@@ -0,0 +1,242 @@
+"""
+This source file is part of an OSTIS project. For the latest info, see https://github.com/ostis-ai
+Distributed under the MIT License
+(See an accompanying file LICENSE or a copy at https://opensource.org/licenses/MIT)
+"""
+
+import bisect
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from logging import getLogger
+from typing import Any, Callable, Deque, Dict, List, NamedTuple, Optional, Tuple
+
+from sc_client.constants.common import ClientCommand
+from sc_client.models import ScAddr
+
+from sc_kpm.sc_result import ScResult
+from sc_kpm.sc_tracer import _RequestHooks
+
+LATENCY_BUCKETS: Tuple[float, ...] = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LATENCY_PERCENTILES: Tuple[int, ...] = (50, 90, 99)
+
+
+class ScEventMeasurement(NamedTuple):
+    result: ScResult
+    duration: Optional[float] = None  # None if the event wasn't handled (e.g. it was dropped)
+    kb_time: float = 0.0  # Time of requests to the sc-server
+
+
+class ScAgentMetricsInfo(NamedTuple):
+    events: int  # Received events
+    results: Dict[ScResult, int]
+    failed: int  # Events with raised exceptions
+    total_time: float
+    kb_time: float
+    python_time: float
+    latency_percentiles: Dict[int, float]  # Percentiles of recent events
+    latency_buckets: Tuple[int, ...]  # Cumulative counts of events by LATENCY_BUCKETS and +Inf
+
+
+logger = getLogger(__name__)
+
+_kb_time: ContextVar[Optional[List[float]]] = ContextVar("sc_kpm_kb_time", default=None)
+
+
+def _record_kb_time(_: ClientCommand, __: Tuple[Any, ...], duration: float) -> None:
+    kb_time = _kb_time.get()
+    if kb_time is not None:
+        kb_time[0] += duration
+
+
+# The hook is added once, so timers only set the counter of their context without the lock of hooks
+_RequestHooks.add(_record_kb_time)
+
+
+class EventTimer:
+    """Context manager which measures duration of the block and time of requests to the sc-server in it"""
+
+    def __init__(self) -> None:
+        self.duration = 0.0
+        self.kb_time = 0.0
+        self._kb_time = [0.0]
+        self._start = 0.0
+        self._token: Any = None
+
+    def __enter__(self) -> "EventTimer":
+        self._token = _kb_time.set(self._kb_time)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.duration = time.perf_counter() - self._start
+        self.kb_time = self._kb_time[0]
+        _kb_time.reset(self._token)
+
+
+def measure(handler: Callable[..., ScResult], *event: ScAddr) -> ScEventMeasurement:
+    """Call the event handler and measure it, the function is picklable for worker processes"""
+    with EventTimer() as timer:
+        result = handler(*event)
+    return ScEventMeasurement(result, timer.duration, timer.kb_time)
+
+
+class ScAgentMetrics:
+    """Thread-safe counters and latency histogram of agent events"""
+
+    def __init__(self, max_samples: int = 1024) -> None:
+        """
+        Initialize ScAgentMetrics.
+
+        :param max_samples: Number of recent latencies which are kept for percentiles.
+        """
+        self._lock = threading.Lock()
+        self._events = 0
+        self._results: Counter = Counter()
+        self._failed = 0
+        self._total_time = 0.0
+        self._kb_time = 0.0
+        self._buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self._samples: Deque[float] = deque(maxlen=max_samples)
+
+    def record_event(self) -> None:
+        with self._lock:
+            self._events += 1
+
+    def record(self, measurement: Optional[ScEventMeasurement]) -> None:
+        """Record the handled event, None means that its handler raised an exception"""
+        with self._lock:
+            if measurement is None:
+                self._failed += 1
+                return
+            self._results[measurement.result] += 1
+            if measurement.duration is None:
+                return
+            self._total_time += measurement.duration
+            self._kb_time += measurement.kb_time
+            self._buckets[bisect.bisect_left(LATENCY_BUCKETS, measurement.duration)] += 1
+            self._samples.append(measurement.duration)
+
+    def info(self) -> ScAgentMetricsInfo:
+        return combine_metrics(self)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._events = 0
+            self._results.clear()
+            self._failed = 0
+            self._total_time = 0.0
+            self._kb_time = 0.0
+            self._buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+            self._samples.clear()
+
+
+def combine_metrics(*metrics: ScAgentMetrics) -> ScAgentMetricsInfo:
+    """Roll up metrics of many agents to one snapshot"""
+    # pylint: disable=protected-access
+    events = failed = 0
+    results: Counter = Counter()
+    total_time = kb_time = 0.0
+    buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+    samples: List[float] = []
+    for agent_metrics in metrics:
+        with agent_metrics._lock:
+            events += agent_metrics._events
+            results.update(agent_metrics._results)
+            failed += agent_metrics._failed
+            total_time += agent_metrics._total_time
+            kb_time += agent_metrics._kb_time
+            buckets = [count + other for count, other in zip(buckets, agent_metrics._buckets)]
+            samples.extend(agent_metrics._samples)
+    samples.sort()
+    percentiles = {
+        percentile: samples[min(len(samples) - 1, len(samples) * percentile // 100)] if samples else 0.0
+        for percentile in LATENCY_PERCENTILES
+    }
+    cumulative_buckets = []
+    for count in buckets:
+        cumulative_buckets.append(count + (cumulative_buckets[-1] if cumulative_buckets else 0))
+    return ScAgentMetricsInfo(
+        events=events,
+        results=dict(results),
+        failed=failed,
+        total_time=total_time,
+        kb_time=kb_time,
+        python_time=total_time - kb_time,
+        latency_percentiles=percentiles,
+        latency_buckets=tuple(cumulative_buckets),
+    )
+
+
+def to_prometheus_text(agents_metrics: Dict[str, ScAgentMetricsInfo]) -> str:
+    """Format metrics of agents in the Prometheus text exposition format"""
+
+    def label(value: str) -> str:
+        return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+    lines = [
+        "# HELP sc_kpm_agent_events_total Events received by the agent.",
+        "# TYPE sc_kpm_agent_events_total counter",
+        *(
+            f'sc_kpm_agent_events_total{{agent="{label(agent)}"}} {info.events}'
+            for agent, info in agents_metrics.items()
+        ),
+        "# HELP sc_kpm_agent_results_total Handled events by the result.",
+        "# TYPE sc_kpm_agent_results_total counter",
+        *(
+            f'sc_kpm_agent_results_total{{agent="{label(agent)}",result="{result.name}"}} {count}'
+            for agent, info in agents_metrics.items()
+            for result, count in sorted(info.results.items())
+        ),
+        "# HELP sc_kpm_agent_failures_total Events with raised exceptions.",
+        "# TYPE sc_kpm_agent_failures_total counter",
+        *(
+            f'sc_kpm_agent_failures_total{{agent="{label(agent)}"}} {info.failed}'
+            for agent, info in agents_metrics.items()
+        ),
+        "# HELP sc_kpm_agent_kb_seconds_total Time of requests to the sc-server.",
+        "# TYPE sc_kpm_agent_kb_seconds_total counter",
+        *(
+            f'sc_kpm_agent_kb_seconds_total{{agent="{label(agent)}"}} {info.kb_time}'
+            for agent, info in agents_metrics.items()
+        ),
+        "# HELP sc_kpm_agent_latency_seconds Latency of the agent callback.",
+        "# TYPE sc_kpm_agent_latency_seconds histogram",
+    ]
+    for agent, info in agents_metrics.items():
+        bounds = [*map(str, LATENCY_BUCKETS), "+Inf"]
+        lines.extend(
+            f'sc_kpm_agent_latency_seconds_bucket{{agent="{label(agent)}",le="{bound}"}} {count}'
+            for bound, count in zip(bounds, info.latency_buckets)
+        )
+        lines.append(f'sc_kpm_agent_latency_seconds_sum{{agent="{label(agent)}"}} {info.total_time}')
+        lines.append(f'sc_kpm_agent_latency_seconds_count{{agent="{label(agent)}"}} {info.latency_buckets[-1]}')
+    return "\n".join(lines) + "\n"
+
+
+def start_metrics_server(
+    get_metrics: Callable[[], Dict[str, ScAgentMetricsInfo]], host: str, port: int
+) -> ThreadingHTTPServer:
+    """Serve metrics of agents in the Prometheus text format on /metrics in the daemon thread"""
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:  # pylint: disable=invalid-name
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = to_prometheus_text(get_metrics()).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: Any) -> None:  # pylint: disable=redefined-builtin
+            logger.debug(format, *args)
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="sc-kpm-metrics-server", daemon=True).start()
+    return server
@@ -0,0 +1,183 @@
+"""
+This source file is part of an OSTIS project. For the latest info, see https://github.com/ostis-ai
+Distributed under the MIT License
+(See an accompanying file LICENSE or a copy at https://opensource.org/licenses/MIT)
+"""
+
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from logging import getLogger
+from typing import Callable, Dict, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+_profiling_lock = threading.Lock()
+
+
+class ScAgentProfiler:
+    """
+    Opt-in profiler of agents activations, profiles are aggregated by agent classes.
+    Every Nth activation is profiled with cProfile and saved to <class>.prof (readable by pstats or snakeviz).
+    Stacks of activations which are slower than the threshold are sampled by the background thread
+    and saved to <class>.folded in the collapsed format of flame graphs.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        every_nth: int = 0,
+        slower_than: Optional[float] = None,
+        sampling_interval: float = 0.005,
+        dump_interval: float = 60.0,
+    ) -> None:
+        """
+        Initialize ScAgentProfiler.
+
+        :param directory: Directory of saved profiles.
+        :param every_nth: Profile every Nth activation of each agent class with cProfile, 0 disables it.
+        :param slower_than: Sample stacks of activations which are running longer than it (in seconds).
+        :param sampling_interval: Interval of stacks sampling in seconds.
+        :param dump_interval: Interval of saving profiles to the directory in seconds.
+        """
+        self._directory = directory
+        self._every_nth = every_nth
+        self._slower_than = slower_than
+        self._sampling_interval = sampling_interval
+        self._dump_interval = dump_interval
+        self._lock = threading.Lock()
+        self._activations: Counter = Counter()
+        self._slow_activations: Counter = Counter()
+        self._stats: Dict[str, pstats.Stats] = {}
+        self._stacks: Dict[str, Counter] = {}
+        self._running: Dict[int, Tuple[str, float]] = {}  # Thread id -> agent class and start time
+        self._is_dirty = False
+        self._stop_event = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self.logger = getLogger(f"{self.__module__}.{self.__class__.__name__}")
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(directory={self._directory!r}, every_nth={self._every_nth}, "
+            f"slower_than={self._slower_than})"
+        )
+
+    def profile(self, agent_class: str, handler: Callable[..., T], *args) -> T:
+        """Call the activation handler and profile it if it is needed"""
+        with self._lock:
+            self._activations[agent_class] += 1
+            is_profiled = self._every_nth > 0 and self._activations[agent_class] % self._every_nth == 0
+        # Only one cProfile can be active in the process (sys.monitoring since Python 3.12),
+        # so the activation isn't profiled if another one is being profiled.
+        # The lock is released in finally, because with statement can't acquire it without blocking
+        if is_profiled and _profiling_lock.acquire(blocking=False):  # pylint: disable=consider-using-with
+            try:
+                profile = cProfile.Profile()
+                try:
+                    return profile.runcall(handler, *args)
+                finally:
+                    self._add_stats(agent_class, profile)
+            finally:
+                _profiling_lock.release()
+        if self._slower_than is None:
+            return handler(*args)
+        self._start_sampler()
+        thread_id = threading.get_ident()
+        start = time.monotonic()
+        with self._lock:
+            self._running[thread_id] = (agent_class, start)
+        try:
+            return handler(*args)
+        finally:
+            with self._lock:
+                del self._running[thread_id]
+                if time.monotonic() - start > self._slower_than:
+                    self._slow_activations[agent_class] += 1
+
+    def dump(self) -> List[str]:
+        """Save aggregated profiles to the directory and return paths of saved files"""
+        with self._lock:
+            stats = dict(self._stats)
+            stacks = {agent_class: Counter(class_stacks) for agent_class, class_stacks in self._stacks.items()}
+            self._is_dirty = False
+            os.makedirs(self._directory, exist_ok=True)
+            paths = []
+            for agent_class, class_stats in stats.items():
+                paths.append(os.path.join(self._directory, f"{agent_class}.prof"))
+                class_stats.dump_stats(paths[-1])
+        for agent_class, class_stacks in stacks.items():
+            paths.append(os.path.join(self._directory, f"{agent_class}.folded"))
+            with open(paths[-1], "w", encoding="utf-8") as file:
+                file.writelines(f"{stack} {count}\n" for stack, count in class_stacks.most_common())
+        return paths
+
+    def info(self) -> Dict[str, Tuple[int, int]]:
+        """Get numbers of activations and slow activations by agent classes"""
+        with self._lock:
+            return {
+                agent_class: (count, self._slow_activations[agent_class])
+                for agent_class, count in self._activations.items()
+            }
+
+    def close(self) -> None:
+        """Stop the sampler and save profiles"""
+        self._stop_event.set()
+        sampler, self._sampler = self._sampler, None
+        if sampler is not None:
+            sampler.join()
+        self.dump()
+
+    def _add_stats(self, agent_class: str, profile: cProfile.Profile) -> None:
+        with self._lock:
+            if agent_class in self._stats:
+                self._stats[agent_class].add(profile)
+            else:
+                self._stats[agent_class] = pstats.Stats(profile)
+            self._is_dirty = True
+        self._start_sampler()  # Profiles are dumped by the sampler thread
+
+    def _start_sampler(self) -> None:
+        if self._sampler is not None:
+            return
+        with self._lock:
+            if self._sampler is None and not self._stop_event.is_set():
+                self._sampler = threading.Thread(target=self._sample, name="sc-agent-profiler", daemon=True)
+                self._sampler.start()
+
+    def _sample(self) -> None:
+        last_dump = time.monotonic()
+        while not self._stop_event.wait(self._sampling_interval):
+            now = time.monotonic()
+            with self._lock:
+                slow = [
+                    (thread_id, agent_class)
+                    for thread_id, (agent_class, start) in self._running.items()
+                    if self._slower_than is not None and now - start > self._slower_than
+                ]
+            if slow:
+                frames = sys._current_frames()  # pylint: disable=protected-access
+                with self._lock:
+                    for thread_id, agent_class in slow:
+                        frame = frames.get(thread_id)
+                        if frame is not None:
+                            self._stacks.setdefault(agent_class, Counter())[_collapse_stack(frame)] += 1
+                            self._is_dirty = True
+            if self._is_dirty and now - last_dump > self._dump_interval:
+                last_dump = now
+                try:
+                    self.dump()
+                except OSError as error:
+                    self.logger.error("Failed to save profiles: %s", repr(error))
+
+
+def _collapse_stack(frame) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
@@ -4,28 +4,69 @@ Distributed under the MIT License
 (See an accompanying file LICENSE or a copy at https://opensource.org/licenses/MIT)
 """
 
+import sqlite3
+import threading
+import time
 import warnings
+from collections import OrderedDict
+from concurrent.futures import Future
+from contextlib import closing
 from logging import Logger, getLogger
-from typing import Dict, Optional
+from typing import Dict, List, NamedTuple, Optional, Set, Type
 
 from sc_client import client
 from sc_client.client import erase_elements
-from sc_client.constants.exceptions import InvalidValueError
+from sc_client.constants.common import ScEventType
+from sc_client.constants.exceptions import InvalidValueError, ServerError
 from sc_client.constants.sc_type import CONST_NODE_ROLE, ScType
-from sc_client.models import ScAddr, ScIdtfResolveParams
+from sc_client.models import ScAddr, ScEventSubscription, ScEventSubscriptionParams, ScIdtfResolveParams
+
+from sc_kpm.sc_result import ScResult
 
 Idtf = str
 
+_CREATE_KEYNODES_TABLE_QUERY = (
+    "CREATE TABLE IF NOT EXISTS keynodes (url TEXT, idtf TEXT, addr INTEGER, type INTEGER, PRIMARY KEY (url, idtf))"
+)
+
+
+class KeynodesCacheInfo(NamedTuple):
+    hits: int
+    negative_hits: int
+    misses: int
+    negative_size: int
+
 
 class ScKeynodesMeta(type):
-    """Metaclass to use ScKeynodes without creating an instance of a class"""
+    """
+    Metaclass to use ScKeynodes without creating an instance of a class.
+
+    Cached keynodes are read without locking. Concurrent misses of the same identifier share one request.
+    """
 
     def __init__(cls, *args, **kwargs) -> None:
         super().__init__(*args, **kwargs)
         cls._dict: Dict[Idtf, ScAddr] = {}
+        cls._lock = threading.RLock()
+        cls._erasure_lock = threading.Lock()
+        cls._in_flight: Dict[Idtf, Future] = {}
+        cls._identifiers: Dict[ScAddr, Idtf] = {}
+        cls._is_erasure_tracked: bool = False
+        cls._erasure_subscriptions: Dict[ScAddr, ScEventSubscription] = {}
+        cls._erasure_subscribing: Set[ScAddr] = set()  # Keynodes which subscriptions are being created
+        cls._negative_dict: Dict[Idtf, float] = OrderedDict()
+        cls._negative_max_size: int = 0
+        cls._negative_ttl: float = 0
+        cls._reverse_dict: Dict[ScAddr, Idtf] = OrderedDict()  # Identifiers of requested elements
+        cls._reverse_max_size: int = 0
+        cls._hits: int = 0
+        cls._negative_hits: int = 0
+        cls._misses: int = 0
         cls._logger: Logger = getLogger(f"{__name__}.{cls.__name__}")
         cls._min_rrel_index: int = 1
-        cls._max_rrel_index: int = 10
+        cls._rrel_block_size: int = 64
+        cls._rrel_addrs: List[Optional[ScAddr]] = []
+        cls._rrel_indices: Dict[ScAddr, int] = {}
 
     def __call__(cls, *args, **kwargs) -> None:
         raise TypeError(f"Use {cls.__name__} without initialization")
@@ -41,7 +82,7 @@ class ScKeynodesMeta(type):
     def erase(cls, identifier: Idtf) -> bool:
         """Erase keynode from the kb and memory and return boolean status"""
         addr = cls.__getitem__(identifier)  # pylint: disable=no-value-for-parameter
-        del cls._dict[identifier]
+        cls._remove(identifier)  # pylint: disable=no-value-for-parameter
         return erase_elements(addr)
 
     def delete(cls, identifier: Idtf) -> bool:
@@ -49,7 +90,7 @@ class ScKeynodesMeta(type):
             "ScKeynodesMeta 'delete' method is deprecated. Use `erase` method instead.",
             DeprecationWarning,
         )
-        return cls.erase(identifier)
+        return cls.erase(identifier)  # pylint: disable=no-value-for-parameter
 
     def get(cls, identifier: Idtf) -> ScAddr:
         """Get keynode, can be ScAddr(0)"""
@@ -59,28 +100,437 @@ class ScKeynodesMeta(type):
         """Get keynode. If sc_type is valid, an element will be created in the KB"""
         addr = cls._dict.get(identifier)
         if addr is None:
-            params = ScIdtfResolveParams(idtf=identifier, type=sc_type)
-            addr = client.resolve_keynodes(params)[0]
-            if addr.is_valid():
-                cls._dict[identifier] = addr
-            cls._logger.debug(
-                "Resolved %s identifier with type %s: %s",
-                repr(identifier),
-                repr(sc_type),
-                repr(addr),
-            )
+            return cls.prefetch({identifier: sc_type})[identifier]  # pylint: disable=no-value-for-parameter
+        cls._hits += 1
         return addr
 
+    def prefetch(cls, types_map: Dict[Idtf, Optional[ScType]]) -> Dict[Idtf, ScAddr]:
+        """
+        Get keynodes resolving all missing identifiers in one request.
+        If sc_type of identifier is valid, an element will be created in the KB
+        """
+        missing_identifiers = []
+        in_flight_futures = set()
+        with cls._lock:
+            now = time.monotonic()
+            for identifier, sc_type in types_map.items():
+                if identifier in cls._dict:
+                    cls._hits += 1
+                elif not sc_type and cls._is_known_missing(identifier, now):  # pylint: disable=no-value-for-parameter
+                    cls._negative_hits += 1
+                elif identifier in cls._in_flight:
+                    in_flight_futures.add(cls._in_flight[identifier])
+                else:
+                    missing_identifiers.append(identifier)
+            if missing_identifiers:
+                future = Future()
+                cls._in_flight.update((identifier, future) for identifier in missing_identifiers)
+                cls._misses += len(missing_identifiers)
+        if missing_identifiers:
+            # pylint: disable-next=no-value-for-parameter
+            cls._resolve_in_flight({identifier: types_map[identifier] for identifier in missing_identifiers}, future)
+        for in_flight_future in in_flight_futures:
+            in_flight_future.result()
+        # Identifiers searched by other threads without types must be resolved with given types
+        unresolved_types_map = {
+            identifier: sc_type
+            for identifier, sc_type in types_map.items()
+            if sc_type and identifier not in cls._dict and identifier not in missing_identifiers
+        }
+        if unresolved_types_map:
+            cls.prefetch(unresolved_types_map)  # pylint: disable=no-value-for-parameter
+        return {identifier: cls._dict.get(identifier, ScAddr(0)) for identifier in types_map}
+
+    def _resolve_in_flight(cls, types_map: Dict[Idtf, Optional[ScType]], future: Future) -> None:
+        """Resolve identifiers in one request and notify threads waiting for them"""
+        params = [ScIdtfResolveParams(idtf=identifier, type=sc_type) for identifier, sc_type in types_map.items()]
+        try:
+            addrs = client.resolve_keynodes(*params)
+        except Exception as error:
+            with cls._lock:
+                for identifier in types_map:
+                    del cls._in_flight[identifier]
+            future.set_exception(error)
+            raise
+        with cls._lock:
+            now = time.monotonic()
+            for identifier, addr in zip(types_map, addrs):
+                cls._logger.debug(
+                    "Resolved %s identifier with type %s: %s",
+                    repr(identifier),
+                    repr(types_map[identifier]),
+                    repr(addr),
+                )
+                if addr.is_valid():
+                    cls._negative_dict.pop(identifier, None)
+                else:
+                    cls._add_missing(identifier, now)  # pylint: disable=no-value-for-parameter
+                del cls._in_flight[identifier]
+            # pylint: disable-next=no-value-for-parameter
+            cls._add({identifier: addr for identifier, addr in zip(types_map, addrs) if addr.is_valid()})
+        future.set_result(None)
+        cls._subscribe_to_erasure()  # pylint: disable=no-value-for-parameter
+
+    def configure_negative_cache(cls, max_size: int, ttl: float) -> None:
+        """
+        Cache up to max_size identifiers that are not found in the KB for ttl seconds.
+        Getting them doesn't send requests until ttl expires. Zero max_size disables the cache
+        """
+        with cls._lock:
+            cls._negative_max_size = max_size
+            cls._negative_ttl = ttl
+            while len(cls._negative_dict) > max_size:
+                cls._negative_dict.popitem(last=False)
+
+    def invalidate_negative_cache(cls, *identifiers: Idtf) -> None:
+        """Forget that identifiers are not found in the KB. Forget all identifiers if none are given"""
+        with cls._lock:
+            if not identifiers:
+                cls._negative_dict.clear()
+            for identifier in identifiers:
+                cls._negative_dict.pop(identifier, None)
+
+    def configure_identifiers_cache(cls, max_size: int) -> None:
+        """
+        Cache system identifiers of up to max_size elements got by get_elements_system_identifiers,
+        the least recently used ones are forgotten. Zero max_size disables the cache
+        """
+        with cls._lock:
+            cls._reverse_max_size = max_size
+            while len(cls._reverse_dict) > max_size:
+                cls._reverse_dict.popitem(last=False)
+
+    def invalidate_identifiers_cache(cls, *addrs: ScAddr) -> None:
+        """Forget cached system identifiers of elements. Forget all identifiers if no elements are given"""
+        with cls._lock:
+            if not addrs:
+                cls._reverse_dict.clear()
+            for addr in addrs:
+                cls._reverse_dict.pop(addr, None)
+
+    def cache_info(cls) -> KeynodesCacheInfo:
+        """
+        Get statistics of cache hits, negative cache hits and requested identifiers.
+        Hits of cached keynodes are counted without locking, so they are approximate under concurrent access
+        """
+        return KeynodesCacheInfo(cls._hits, cls._negative_hits, cls._misses, len(cls._negative_dict))
+
+    def _is_known_missing(cls, identifier: Idtf, now: float) -> bool:
+        expiration_time = cls._negative_dict.get(identifier)
+        if expiration_time is None:
+            return False
+        if expiration_time < now:
+            cls._negative_dict.pop(identifier, None)
+            return False
+        return True
+
+    def _add_missing(cls, identifier: Idtf, now: float) -> None:
+        if cls._negative_max_size <= 0:
+            return
+        cls._negative_dict[identifier] = now + cls._negative_ttl
+        cls._negative_dict.move_to_end(identifier)
+        if len(cls._negative_dict) > cls._negative_max_size:
+            cls._negative_dict.popitem(last=False)
+
+    def _get_identifier(cls, addr: ScAddr) -> Optional[Idtf]:
+        """Get system identifier of cached keynode or recently requested element"""
+        identifier = cls._identifiers.get(addr)
+        if identifier is None and cls._reverse_max_size > 0:
+            with cls._lock:
+                identifier = cls._reverse_dict.get(addr)
+                if identifier is not None:
+                    cls._reverse_dict.move_to_end(addr)
+        return identifier
+
+    def _add_identifiers(cls, identifiers: Dict[ScAddr, Idtf]) -> None:
+        """Remember system identifiers of elements which are not keynodes, the least recently used are forgotten"""
+        if cls._reverse_max_size <= 0:
+            return
+        with cls._lock:
+            for addr, identifier in identifiers.items():
+                cls._reverse_dict[addr] = identifier
+                cls._reverse_dict.move_to_end(addr)
+            while len(cls._reverse_dict) > cls._reverse_max_size:
+                cls._reverse_dict.popitem(last=False)
+
+    def save(cls, path: str, sc_server_url: str) -> None:
+        """Save cached keynodes of the sc-server with their types to the sqlite file"""
+        if not cls._dict:
+            return
+        identifiers = list(cls._dict)
+        try:
+            types = client.get_elements_types(*(cls._dict[identifier] for identifier in identifiers))
+        except ServerError:
+            cls._logger.warning("Some of cached keynodes are erased from the KB, they are removed before saving")
+            cls._remove_outdated()  # pylint: disable=no-value-for-parameter
+            if not cls._dict:
+                return
+            identifiers = list(cls._dict)
+            # The error is propagated if it happens again
+            types = client.get_elements_types(*(cls._dict[identifier] for identifier in identifiers))
+        with closing(sqlite3.connect(path)) as connection:
+            with connection:  # Transaction
+                connection.execute(_CREATE_KEYNODES_TABLE_QUERY)
+                connection.execute("DELETE FROM keynodes WHERE url = ?", (sc_server_url,))
+                connection.executemany(
+                    "INSERT INTO keynodes VALUES (?, ?, ?, ?)",
+                    (
+                        (sc_server_url, identifier, cls._dict[identifier].value, element_type.value)
+                        for identifier, element_type in zip(identifiers, types)
+                    ),
+                )
+        cls._logger.debug("Saved %d keynodes to %s", len(identifiers), repr(path))
+
+    def load(cls, path: str, sc_server_url: str) -> int:
+        """
+        Load keynodes of the sc-server saved to the sqlite file.
+        They are validated by types in one request instead of resolving. Return the number of loaded keynodes
+        """
+        with closing(sqlite3.connect(path)) as connection:
+            with connection:  # Transaction
+                connection.execute(_CREATE_KEYNODES_TABLE_QUERY)
+                rows = connection.execute(
+                    "SELECT idtf, addr, type FROM keynodes WHERE url = ?", (sc_server_url,)
+                ).fetchall()
+        rows = [row for row in rows if row[0] not in cls._dict]
+        if not rows:
+            return 0
+        try:
+            types = client.get_elements_types(*(ScAddr(addr_value) for _, addr_value, _ in rows))
+        except ServerError:
+            cls._logger.warning("Saved keynodes in %s are outdated: some of them are erased from the KB", repr(path))
+            return 0
+        loaded_keynodes = {
+            identifier: ScAddr(addr_value)
+            for (identifier, addr_value, type_value), element_type in zip(rows, types)
+            if element_type.value == type_value
+        }
+        with cls._lock:
+            cls._add(loaded_keynodes)  # pylint: disable=no-value-for-parameter
+        cls._subscribe_to_erasure()  # pylint: disable=no-value-for-parameter
+        cls._logger.debug("Loaded %d of %d saved keynodes from %s", len(loaded_keynodes), len(rows), repr(path))
+        return len(loaded_keynodes)
+
+    def _remove_outdated(cls) -> None:
+        """Remove cached keynodes which ScAddrs differ from the KB ones in one request"""
+        identifiers = list(cls._dict)
+        if not identifiers:
+            return
+        params = [ScIdtfResolveParams(idtf=identifier, type=None) for identifier in identifiers]
+        addrs = client.resolve_keynodes(*params)
+        with cls._lock:
+            subscriptions = [
+                cls._remove(identifier)  # pylint: disable=no-value-for-parameter
+                for identifier, addr in zip(identifiers, addrs)
+                if addr != cls._dict.get(identifier)
+            ]
+        # pylint: disable-next=no-value-for-parameter
+        cls._destroy_erasure_subscriptions([subscription for subscription in subscriptions if subscription])
+
+    def _clear(cls) -> None:
+        """Forget all cached keynodes, rrel nodes and identifiers, e.g. to measure cold startup"""
+        cls._unsubscribe_from_erasure()  # pylint: disable=no-value-for-parameter
+        with cls._lock:
+            cls._dict.clear()
+            cls._identifiers.clear()
+            cls._negative_dict.clear()
+            cls._reverse_dict.clear()
+            cls._rrel_addrs.clear()
+            cls._rrel_indices.clear()
+
+    def _revalidate(cls) -> None:
+        """Remove outdated keynodes after reconnection to the sc-server and restore erase events subscriptions"""
+        with cls._erasure_lock:
+            cls._erasure_subscriptions.clear()  # They were destroyed with the connection
+        with cls._lock:
+            cls._negative_dict.clear()
+            cls._reverse_dict.clear()
+        cls._remove_outdated()  # pylint: disable=no-value-for-parameter
+        cls._subscribe_to_erasure()  # pylint: disable=no-value-for-parameter
+
+    def track_erasure(cls, is_enabled: bool = True) -> None:
+        """
+        Enable or disable tracking of cached keynodes erasure.
+        When it is enabled, keynodes are subscribed to erase events and removed from the cache after erasing by anyone.
+        Changes of system identifiers of existing elements aren't tracked, such keynodes are removed on reconnection
+        """
+        cls._is_erasure_tracked = is_enabled
+        if is_enabled:
+            cls._subscribe_to_erasure()  # pylint: disable=no-value-for-parameter
+        else:
+            cls._unsubscribe_from_erasure()  # pylint: disable=no-value-for-parameter
+
+    def _add(cls, keynodes: Dict[Idtf, ScAddr]) -> None:
+        """Add keynodes to the cache, it must be called with the lock"""
+        cls._dict.update(keynodes)
+        cls._identifiers.update((addr, identifier) for identifier, addr in keynodes.items())
+
+    def _remove(cls, identifier: Idtf) -> Optional[ScEventSubscription]:
+        """Remove keynode from the cache and return its erase events subscription which isn't destroyed"""
+        with cls._lock:
+            addr = cls._dict.pop(identifier, None)
+            if addr is None:
+                return None
+            cls._identifiers.pop(addr, None)
+            cls._reverse_dict.pop(addr, None)
+            rrel_index = cls._rrel_indices.pop(addr, None)
+            if rrel_index is not None:
+                cls._rrel_addrs[rrel_index - cls._min_rrel_index] = None
+        with cls._erasure_lock:
+            return cls._erasure_subscriptions.pop(addr, None)
+
+    def _subscribe_to_erasure(cls) -> None:
+        """Subscribe all cached keynodes which are not subscribed yet in one request"""
+        if not cls._is_erasure_tracked or not client.is_connected():
+            return
+        with cls._erasure_lock:
+            addrs = [
+                addr
+                for addr in list(cls._identifiers)
+                if addr not in cls._erasure_subscriptions and addr not in cls._erasure_subscribing
+            ]
+            cls._erasure_subscribing.update(addrs)
+        if not addrs:
+            return
+        params = [ScEventSubscriptionParams(addr, ScEventType.BEFORE_ERASE_ELEMENT, cls._on_erase) for addr in addrs]
+        try:
+            subscriptions = client.create_elementary_event_subscriptions(*params)
+        finally:
+            with cls._erasure_lock:
+                cls._erasure_subscribing.difference_update(addrs)
+        outdated_subscriptions = []
+        with cls._erasure_lock:
+            for addr, subscription in zip(addrs, subscriptions):
+                if cls._is_erasure_tracked and addr in cls._identifiers:
+                    cls._erasure_subscriptions[addr] = subscription
+                else:  # Keynode is removed or tracking is disabled during the request
+                    outdated_subscriptions.append(subscription)
+        cls._destroy_erasure_subscriptions(outdated_subscriptions)  # pylint: disable=no-value-for-parameter
+        cls._logger.debug("Subscribed %d keynodes to erase events", len(addrs) - len(outdated_subscriptions))
+
+    def _unsubscribe_from_erasure(cls) -> None:
+        """Destroy all erase events subscriptions in one request"""
+        with cls._erasure_lock:
+            subscriptions = list(cls._erasure_subscriptions.values())
+            cls._erasure_subscriptions.clear()
+        cls._destroy_erasure_subscriptions(subscriptions)  # pylint: disable=no-value-for-parameter
+
+    def _destroy_erasure_subscriptions(cls, subscriptions: List[ScEventSubscription]) -> None:
+        if subscriptions and client.is_connected():
+            client.destroy_elementary_event_subscriptions(*subscriptions)
+
+    def _on_erase(cls, addr: ScAddr, *_) -> ScResult:
+        identifier = cls._identifiers.get(addr)
+        if identifier is None:
+            return ScResult.SKIP
+        cls._remove(identifier)  # pylint: disable=no-value-for-parameter
+        cls._logger.debug("Removed erased %s keynode from the cache", repr(identifier))
+        return ScResult.OK
+
     def rrel_index(cls, index: int) -> ScAddr:
-        """Get rrel_i node. Max rrel index is 10. Min rrel is 1."""
+        """Get rrel_i node. Min rrel is 1. Rrel nodes are resolved in blocks, so next indices don't need requests"""
         if not isinstance(index, int):
             raise TypeError("Index of rrel node must be int")
-        if index > cls._max_rrel_index:
-            raise KeyError(f"You cannot use rrel more than {cls._max_rrel_index}")
-        if index < cls._min_rrel_index:
+        return cls.rrel_indices(index, index + 1)[0]  # pylint: disable=no-value-for-parameter
+
+    def rrel_indices(cls, start: int, stop: int) -> List[ScAddr]:
+        """Get rrel nodes from rrel_start to rrel_(stop-1) resolving missing blocks in one request"""
+        if start < cls._min_rrel_index:
             raise KeyError(f"You cannot use rrel less than {cls._min_rrel_index}")
-        return cls.resolve(f"rrel_{index}", CONST_NODE_ROLE)  # pylint: disable=no-value-for-parameter
+        offset = start - cls._min_rrel_index
+        addrs = cls._rrel_addrs[offset : stop - cls._min_rrel_index]
+        if len(addrs) == stop - start and all(addr is not None for addr in addrs):
+            cls._hits += len(addrs)
+            return addrs
+        block_size = cls._rrel_block_size
+        block_start = offset - offset % block_size + cls._min_rrel_index
+        block_stop = stop + -(stop - cls._min_rrel_index) % block_size
+        types_map = {f"rrel_{index}": CONST_NODE_ROLE for index in range(block_start, block_stop)}
+        keynodes = cls.prefetch(types_map)  # pylint: disable=no-value-for-parameter
+        with cls._lock:
+            table_size = block_stop - cls._min_rrel_index
+            if len(cls._rrel_addrs) < table_size:
+                cls._rrel_addrs.extend([None] * (table_size - len(cls._rrel_addrs)))
+            for index, addr in enumerate(keynodes.values(), block_start):
+                cls._rrel_addrs[index - cls._min_rrel_index] = addr
+                cls._rrel_indices[addr] = index
+        return list(keynodes.values())[start - block_start : stop - block_start]
 
 
 class ScKeynodes(metaclass=ScKeynodesMeta):
     """Class which provides the ability to cache the identifier and ScAddr of keynodes stored in the KB."""
+
+
+class ScKeynode:
+    """
+    Declaration of keynode in ScKeynodesContainer.
+    Identifier is the attribute name if it isn't given, sc_type None means that keynode isn't generated.
+    """
+
+    def __init__(self, identifier: Optional[Idtf] = None, sc_type: Optional[ScType] = None) -> None:
+        self.identifier = identifier
+        self.sc_type = sc_type
+        self.name = ""
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.identifier!r}, {self.sc_type!r})"
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self.name = name
+        self.identifier = self.identifier or name
+
+    def __get__(self, instance: Optional["ScKeynodesContainer"], owner: Type["ScKeynodesContainer"]) -> ScAddr:
+        owner.resolve()
+        return getattr(owner, self.name)
+
+
+class ScKeynodesContainer:
+    """
+    Base class for declarative keynodes. All keynodes of the class are resolved in one request
+    on ScServer.connect or on the first access, after that they are plain ScAddr attributes.
+    Keynodes which aren't found and have no sc_type are invalid ScAddr(0).
+    """
+
+    _containers: List[Type["ScKeynodesContainer"]] = []
+    _keynodes: Dict[str, ScKeynode] = {}
+    _is_resolved: bool = True
+
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+        cls._keynodes = {name: value for name, value in vars(cls).items() if isinstance(value, ScKeynode)}
+        cls._is_resolved = not cls._keynodes
+        ScKeynodesContainer._containers.append(cls)
+
+    @classmethod
+    def resolve(cls) -> None:
+        """Resolve keynodes of the class and its bases in one request"""
+        cls._resolve_containers([container for container in cls.__mro__ if container in cls._containers])
+
+    @staticmethod
+    def resolve_all() -> None:
+        """Resolve keynodes of all declared classes in one request"""
+        ScKeynodesContainer._resolve_containers(ScKeynodesContainer._containers)
+
+    @staticmethod
+    def _invalidate_all() -> None:
+        """Resolve keynodes of all declared classes again on the next access or resolve_all"""
+        for container in ScKeynodesContainer._containers:
+            container._is_resolved = not container._keynodes  # pylint: disable=protected-access
+            for name, keynode in container._keynodes.items():  # pylint: disable=protected-access
+                setattr(container, name, keynode)
+
+    @staticmethod
+    def _resolve_containers(containers: List[Type["ScKeynodesContainer"]]) -> None:
+        # pylint: disable=protected-access
+        containers = [container for container in containers if not container._is_resolved]
+        types_map: Dict[Idtf, Optional[ScType]] = {}
+        for container in containers:
+            for keynode in container._keynodes.values():
+                types_map[keynode.identifier] = keynode.sc_type or types_map.get(keynode.identifier)
+        if not types_map:
+            return
+        addrs = ScKeynodes.prefetch(types_map)
+        for container in containers:
+            for name, keynode in container._keynodes.items():
+                setattr(container, name, addrs[keynode.identifier])
+            container._is_resolved = True
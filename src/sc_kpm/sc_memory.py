@@ -0,0 +1,509 @@
+"""
+This source file is part of an OSTIS project. For the latest info, see https://github.com/ostis-ai
+Distributed under the MIT License
+(See an accompanying file LICENSE or a copy at https://opensource.org/licenses/MIT)
+"""
+
+from __future__ import annotations
+
+import itertools
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from sc_client import session
+from sc_client.constants import common
+from sc_client.constants.common import RequestType, ScEventType
+from sc_client.constants.sc_type import bitmasks
+
+SC_MEMORY_URL = "memory://"
+
+_CONTENT_TYPES = {0: "int", 1: "float", 2: "string"}
+_NREL_SYSTEM_IDENTIFIER = "nrel_system_identifier"
+
+_TemplateItem = Tuple[str, Any, Optional[str]]
+
+
+class _RequestError(Exception):
+    """Error reported to sc-client as a server error"""
+
+
+class ScMemoryStandIn:
+    """
+    In-process stand-in for the sc-machine websocket server.
+
+    It answers the JSON requests of sc-client with an indexed in-memory graph,
+    so sc-kpm can be tested and profiled without a running sc-machine.
+    Use `install` to route the sc-client session to it and `uninstall` to restore the session.
+    ScServer installs the stand-in of the process for urls like memory:// or memory://?latency=0.002.
+    """
+
+    _instance: Optional[ScMemoryStandIn] = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, latency: float = 0.0) -> None:
+        """
+        Initialize ScMemoryStandIn.
+
+        :param latency: Seconds added to every request to simulate a network round trip.
+        """
+        self.latency = latency
+        self.round_trips = 0
+        self._lock = threading.RLock()
+        self._is_open = False
+        self._patched: Dict[str, Callable] = {}
+        self._original_connection: Any = None
+        self._addr_counter = itertools.count(1)
+        self._subscription_counter = itertools.count(1)
+        self._types: Dict[int, int] = {}
+        self._connectors: Dict[int, Tuple[int, int]] = {}
+        self._outgoing: Dict[int, Set[int]] = defaultdict(set)
+        self._incoming: Dict[int, Set[int]] = defaultdict(set)
+        self._contents: Dict[int, Tuple[Any, str]] = {}
+        self._idtfs: Dict[str, int] = {}
+        self._addr_idtfs: Dict[int, str] = {}
+        self._subscriptions: Dict[int, Tuple[int, str]] = {}
+        self._subscriptions_by_addr: Dict[int, Set[int]] = defaultdict(set)
+        self._handlers = {
+            RequestType.GENERATE_ELEMENTS: self._generate_elements,
+            RequestType.GET_ELEMENTS_TYPES: self._get_elements_types,
+            RequestType.ERASE_ELEMENTS: self._erase_elements,
+            RequestType.HANDLE_CONTENT: self._handle_content,
+            RequestType.SEARCH_KEYNODES: self._search_keynodes,
+            RequestType.SEARCH_BY_TEMPLATE: self._search_by_template,
+            RequestType.GENERATE_BY_TEMPLATE: self._generate_by_template,
+            RequestType.HANDLE_EVENT_SUBSCRIPTIONS: self._handle_event_subscriptions,
+        }
+
+    @classmethod
+    def from_url(cls, url: str) -> ScMemoryStandIn:
+        """Get the stand-in of the process, latency is taken from the url query"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            stand_in = cls._instance
+        latency = parse_qs(urlparse(url).query).get("latency")
+        if latency:
+            stand_in.latency = float(latency[0])
+        return stand_in
+
+    @staticmethod
+    def is_memory_url(url: str) -> bool:
+        return url.startswith(SC_MEMORY_URL)
+
+    def listen(self) -> ScMemoryListener:
+        """Start to serve requests of other processes, e.g. workers of ScProcessExecutor"""
+        return ScMemoryListener(self)
+
+    def install(self) -> None:
+        """Route the sc-client session to the stand-in"""
+        if self._patched:
+            return
+        replacements = {
+            "send_message": self._send_message,
+            "set_connection": self._set_connection,
+            "is_connected": self._is_connected,
+            "close_connection": self._close_connection,
+        }
+        for name, replacement in replacements.items():
+            self._patched[name] = getattr(session, name)
+            setattr(session, name, replacement)
+        self._original_connection = session._ScClientSession.ws_app  # pylint: disable=protected-access
+
+    def uninstall(self) -> None:
+        """Restore the original sc-client session functions"""
+        for name, original in self._patched.items():
+            setattr(session, name, original)
+        self._patched.clear()
+        self._is_open = False
+        session._ScClientSession.ws_app = self._original_connection  # pylint: disable=protected-access
+
+    def _set_connection(self, _: str) -> None:
+        # Each connection has a new connection object as the websocket app of sc-client
+        session._ScClientSession.ws_app = object()  # pylint: disable=protected-access
+        self._is_open = True
+
+    def _is_connected(self) -> bool:
+        return self._is_open
+
+    def _close_connection(self) -> None:
+        # The sc-server destroys event subscriptions of the closed connection
+        with self._lock:
+            self._is_open = False
+            self._subscriptions.clear()
+            self._subscriptions_by_addr.clear()
+
+    def _send_message(self, request_type: RequestType, payload: Any) -> Dict[str, Any]:
+        reconnect_callback = session._ScClientSession.reconnect_callback  # pylint: disable=protected-access
+        if not self._is_open and reconnect_callback is not session.default_reconnect_handler:
+            reconnect_callback()
+        if not self._is_open:
+            raise ConnectionAbortedError("Sc-memory stand-in is not connected")
+        if self.latency:
+            time.sleep(self.latency)
+        events: List[Tuple[int, List[int]]] = []
+        with self._lock:
+            self.round_trips += 1
+            try:
+                status, response_payload = self._handlers[request_type](payload, events)
+            except _RequestError as error:
+                return {common.ID: 0, common.STATUS: False, common.EVENT: False, common.ERRORS: str(error)}
+        for subscription_id, addrs in events:
+            session._on_message(  # pylint: disable=protected-access
+                None, json.dumps({common.ID: subscription_id, common.EVENT: True, common.PAYLOAD: addrs})
+            )
+        return {common.ID: 0, common.STATUS: status, common.EVENT: False, common.PAYLOAD: response_payload}
+
+    # Elements
+
+    def _new_element(self, type_value: int) -> int:
+        addr = next(self._addr_counter)
+        self._types[addr] = type_value
+        return addr
+
+    def _new_connector(self, type_value: int, source: int, target: int, events: List) -> int:
+        if source not in self._types or target not in self._types:
+            raise _RequestError("Connector incident element doesn't exist")
+        connector = self._new_element(type_value)
+        self._connectors[connector] = (source, target)
+        self._outgoing[source].add(connector)
+        self._incoming[target].add(connector)
+        self._collect_events(events, source, connector, target, ScEventType.AFTER_GENERATE_OUTGOING_ARC)
+        self._collect_events(events, target, connector, source, ScEventType.AFTER_GENERATE_INCOMING_ARC)
+        self._collect_events(events, source, connector, target, ScEventType.AFTER_GENERATE_CONNECTOR)
+        self._collect_events(events, target, connector, source, ScEventType.AFTER_GENERATE_CONNECTOR)
+        return connector
+
+    def _erase(self, addr: int, events: List) -> None:
+        if addr not in self._types:
+            return
+        for connector in list(self._outgoing.get(addr, ())) + list(self._incoming.get(addr, ())):
+            self._erase(connector, events)
+        self._collect_events(events, addr, 0, 0, ScEventType.BEFORE_ERASE_ELEMENT)
+        if addr in self._connectors:
+            source, target = self._connectors.pop(addr)
+            self._collect_events(events, source, addr, target, ScEventType.BEFORE_ERASE_OUTGOING_ARC)
+            self._collect_events(events, target, addr, source, ScEventType.BEFORE_ERASE_INCOMING_ARC)
+            self._outgoing[source].discard(addr)
+            self._incoming[target].discard(addr)
+        self._outgoing.pop(addr, None)
+        self._incoming.pop(addr, None)
+        self._contents.pop(addr, None)
+        del self._types[addr]
+        idtf = self._addr_idtfs.pop(addr, None)
+        if idtf is not None:
+            del self._idtfs[idtf]
+
+    def _collect_events(self, events: List, addr: int, connector: int, other: int, event_type: ScEventType) -> None:
+        for subscription_id in self._subscriptions_by_addr.get(addr, ()):
+            if self._subscriptions[subscription_id][1] == event_type.value:
+                events.append((subscription_id, [addr, connector, other]))
+
+    def _generate_elements(self, payload: List[Dict], events: List) -> Tuple[bool, List[int]]:
+        result = []
+        for item in payload:
+            element = item[common.ELEMENT]
+            if element == common.Elements.CONNECTOR:
+                source, target = (
+                    adj[common.VALUE] if adj[common.TYPE] == common.Types.ADDR else result[adj[common.VALUE]]
+                    for adj in (item[common.SOURCE], item[common.TARGET])
+                )
+                result.append(self._new_connector(item[common.TYPE], source, target, events))
+            else:
+                addr = self._new_element(item[common.TYPE])
+                if element == common.Elements.LINK:
+                    self._contents[addr] = (item[common.CONTENT], _CONTENT_TYPES[item[common.CONTENT_TYPE]])
+                result.append(addr)
+        return True, result
+
+    def _get_elements_types(self, payload: List[int], _: List) -> Tuple[bool, List[int]]:
+        if not all(addr in self._types for addr in payload):
+            raise _RequestError("Specified sc-addr is invalid")
+        return True, [self._types[addr] for addr in payload]
+
+    def _erase_elements(self, payload: List[int], events: List) -> Tuple[bool, None]:
+        status = all(addr in self._types for addr in payload)
+        for addr in payload:
+            self._erase(addr, events)
+        return status, None
+
+    # Link contents
+
+    def _handle_content(self, payload: List[Dict], _: List) -> Tuple[bool, List]:
+        result = []
+        for item in payload:
+            command = item[common.COMMAND]
+            if command == common.CommandTypes.SET:
+                is_link = item[common.ADDR] in self._contents
+                if is_link:
+                    self._contents[item[common.ADDR]] = (item[common.DATA], item[common.TYPE])
+                result.append(is_link)
+            elif command == common.CommandTypes.GET:
+                data, content_type = self._contents.get(item[common.ADDR], ("", "string"))
+                result.append({common.VALUE: data, common.TYPE: content_type})
+            elif command == common.CommandTypes.SEARCH:
+                result.append([addr for addr, (data, _) in self._contents.items() if data == item[common.DATA]])
+            elif command == common.CommandTypes.SEARCH_LINKS_BY_CONTENT_SUBSTRING:
+                substring = str(item[common.DATA])
+                result.append([addr for addr, (data, _) in self._contents.items() if substring in str(data)])
+            else:
+                substring = str(item[common.DATA])
+                result.append([data for data, _ in self._contents.values() if substring in str(data)])
+        return True, result
+
+    # Keynodes
+
+    def _search_keynodes(self, payload: List[Dict], events: List) -> Tuple[bool, List[int]]:
+        result = []
+        for item in payload:
+            idtf = item[common.IDTF]
+            addr = self._idtfs.get(idtf, 0)
+            if not addr and item[common.COMMAND] == common.CommandTypes.RESOLVE:
+                addr = self._new_element(item[common.ELEMENT_TYPE])
+                self._set_system_identifier(addr, idtf, events)
+            result.append(addr)
+        return True, result
+
+    def _set_system_identifier(self, addr: int, idtf: str, events: List) -> None:
+        self._idtfs[idtf] = addr
+        self._addr_idtfs[addr] = idtf
+        nrel_system_identifier = self._idtfs.get(_NREL_SYSTEM_IDENTIFIER)
+        if nrel_system_identifier is None:
+            const_node_non_role = bitmasks.SC_TYPE_CONST | bitmasks.SC_TYPE_NODE_NON_ROLE
+            nrel_system_identifier = self._new_element(const_node_non_role)
+            self._set_system_identifier(nrel_system_identifier, _NREL_SYSTEM_IDENTIFIER, events)
+        link = self._new_element(bitmasks.SC_TYPE_CONST | bitmasks.SC_TYPE_NODE_LINK)
+        self._contents[link] = (idtf, "string")
+        relation_arc = self._new_connector(bitmasks.SC_TYPE_CONST | bitmasks.SC_TYPE_COMMON_ARC, addr, link, events)
+        membership_arc_type = bitmasks.SC_TYPE_CONST | bitmasks.SC_TYPE_PERM_ARC | bitmasks.SC_TYPE_POS_ARC
+        self._new_connector(membership_arc_type, nrel_system_identifier, relation_arc, events)
+
+    # Templates
+
+    def _parse_template(self, payload: Dict) -> Tuple[List[List[_TemplateItem]], Dict[str, int]]:
+        template = payload[common.TEMPLATE]
+        if not isinstance(template, list):
+            raise _RequestError("Sc-memory stand-in supports only triple templates")
+        triples = [
+            [(item[common.TYPE], item[common.VALUE], item.get(common.ALIAS)) for item in triple] for triple in template
+        ]
+        bindings = {}
+        for alias, value in (payload.get(common.PARAMS) or {}).items():
+            bindings[alias] = value if isinstance(value, int) else self._idtfs.get(value, 0)
+        for triple in triples:
+            for kind, value, alias in triple:
+                if kind == common.Types.ADDR and alias:
+                    bindings[alias] = value
+        return triples, bindings
+
+    @staticmethod
+    def _template_aliases(triples: List[List[_TemplateItem]]) -> Dict[str, int]:
+        aliases = {}
+        for index, (kind, value, alias) in enumerate(itertools.chain.from_iterable(triples)):
+            if alias and alias not in aliases:
+                aliases[alias] = index
+            if kind == common.Types.ALIAS and value not in aliases:
+                aliases[value] = index
+        return aliases
+
+    @staticmethod
+    def _is_type_matched(element_type: int, template_type: int) -> bool:
+        if template_type & bitmasks.SC_TYPE_VAR:
+            template_type = (template_type & ~bitmasks.SC_TYPE_VAR) | bitmasks.SC_TYPE_CONST
+        return element_type & template_type == template_type
+
+    def _resolve_item(self, item: _TemplateItem, bindings: Dict[str, int]) -> Tuple[Optional[int], int, Optional[str]]:
+        """Return fixed addr (if known), type constraint and alias to bind"""
+        kind, value, alias = item
+        if kind == common.Types.ADDR:
+            return value, 0, alias
+        if kind == common.Types.ALIAS:
+            return bindings.get(value), 0, value
+        return (bindings.get(alias) if alias else None), value, alias
+
+    def _match_triple(self, triple: List[_TemplateItem], bindings: Dict[str, int]) -> Iterator[Tuple[int, int, int]]:
+        (source, source_type, _), (connector, connector_type, _), (target, target_type, _) = (
+            self._resolve_item(item, bindings) for item in triple
+        )
+        if connector is not None:
+            candidates = [connector] if connector in self._connectors else []
+        elif source is not None:
+            candidates = self._outgoing.get(source, ())
+        elif target is not None:
+            candidates = self._incoming.get(target, ())
+        else:
+            candidates = self._connectors.keys()
+        for candidate in list(candidates):
+            candidate_source, candidate_target = self._connectors[candidate]
+            if source is not None and candidate_source != source:
+                continue
+            if target is not None and candidate_target != target:
+                continue
+            if not self._is_type_matched(self._types[candidate], connector_type):
+                continue
+            if source is None and not self._is_type_matched(self._types[candidate_source], source_type):
+                continue
+            if target is None and not self._is_type_matched(self._types[candidate_target], target_type):
+                continue
+            yield candidate_source, candidate, candidate_target
+
+    @staticmethod
+    def _bind_triple(
+        triple: List[_TemplateItem], addrs: Tuple[int, int, int], bindings: Dict[str, int]
+    ) -> Optional[Dict[str, int]]:
+        new_bindings = dict(bindings)
+        for (kind, value, alias), addr in zip(triple, addrs):
+            name = value if kind == common.Types.ALIAS else alias
+            if name is None:
+                continue
+            if new_bindings.setdefault(name, addr) != addr:
+                return None
+        return new_bindings
+
+    def _count_known(self, triple: List[_TemplateItem], bindings: Dict[str, int]) -> int:
+        return sum(self._resolve_item(item, bindings)[0] is not None for item in triple)
+
+    def _search(
+        self, triples: List[List[_TemplateItem]], pending: List[int], bindings: Dict[str, int], matched: Dict
+    ) -> Iterator[Dict[int, Tuple[int, int, int]]]:
+        if not pending:
+            yield dict(matched)
+            return
+        index = max(pending, key=lambda i: self._count_known(triples[i], bindings))
+        rest = [i for i in pending if i != index]
+        for addrs in self._match_triple(triples[index], bindings):
+            new_bindings = self._bind_triple(triples[index], addrs, bindings)
+            if new_bindings is None:
+                continue
+            matched[index] = addrs
+            yield from self._search(triples, rest, new_bindings, matched)
+            del matched[index]
+
+    def _search_by_template(self, payload: Dict, _: List) -> Tuple[bool, Dict]:
+        triples, bindings = self._parse_template(payload)
+        results = []
+        for matched in self._search(triples, list(range(len(triples))), bindings, {}):
+            results.append([addr for index in range(len(triples)) for addr in matched[index]])
+        return True, {common.ALIASES: self._template_aliases(triples), common.ADDRS: results}
+
+    def _generate_by_template(self, payload: Dict, events: List) -> Tuple[bool, Dict]:
+        triples, bindings = self._parse_template(payload)
+        addrs = []
+        for triple in triples:
+            source, connector, target = triple
+            source_addr = self._generate_item(source, bindings)
+            target_addr = self._generate_item(target, bindings)
+            connector_addr = self._resolve_item(connector, bindings)[0]
+            if connector_addr is None:
+                connector_type = self._resolve_item(connector, bindings)[1]
+                connector_type = (connector_type & ~bitmasks.SC_TYPE_VAR) | bitmasks.SC_TYPE_CONST
+                connector_addr = self._new_connector(connector_type, source_addr, target_addr, events)
+                if connector[2]:
+                    bindings[connector[2]] = connector_addr
+            addrs.extend((source_addr, connector_addr, target_addr))
+        return True, {common.ALIASES: self._template_aliases(triples), common.ADDRS: addrs}
+
+    def _generate_item(self, item: _TemplateItem, bindings: Dict[str, int]) -> int:
+        addr, type_value, alias = self._resolve_item(item, bindings)
+        if addr is None:
+            addr = self._new_element((type_value & ~bitmasks.SC_TYPE_VAR) | bitmasks.SC_TYPE_CONST)
+            if alias:
+                bindings[alias] = addr
+        return addr
+
+    # Events
+
+    def _handle_event_subscriptions(self, payload: Dict, _: List) -> Tuple[bool, List[int]]:
+        result = []
+        for item in payload.get(common.CommandTypes.GENERATE, []):
+            subscription_id = next(self._subscription_counter)
+            self._subscriptions[subscription_id] = (item[common.ADDR], item[common.TYPE])
+            self._subscriptions_by_addr[item[common.ADDR]].add(subscription_id)
+            result.append(subscription_id)
+        for subscription_id in payload.get(common.CommandTypes.ERASE, []):
+            addr, _ = self._subscriptions.pop(subscription_id, (0, None))
+            self._subscriptions_by_addr[addr].discard(subscription_id)
+        return True, result
+
+
+class ScMemoryListener:
+    """
+    Listener of requests of other processes to the stand-in.
+    Each connected process is served in its own thread, events of subscriptions are handled in this process.
+    """
+
+    def __init__(self, stand_in: ScMemoryStandIn) -> None:
+        self._stand_in = stand_in
+        self.authkey = os.urandom(32)
+        self._listener = Listener(authkey=self.authkey)
+        self.address = self._listener.address
+        self._is_closed = False
+        self._thread = threading.Thread(target=self._accept, name="sc-memory-listener", daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        """Stop accepting of processes, connected ones are served until they disconnect"""
+        self._is_closed = True
+        with Client(self.address, authkey=self.authkey):  # Wake the accepting thread
+            pass
+        self._thread.join()
+        self._listener.close()
+
+    def _accept(self) -> None:
+        while True:
+            connection = self._listener.accept()
+            if self._is_closed:
+                connection.close()
+                return
+            threading.Thread(target=self._serve, args=(connection,), name="sc-memory-connection", daemon=True).start()
+
+    def _serve(self, connection: Connection) -> None:
+        # pylint: disable=protected-access
+        with connection:
+            while True:
+                try:
+                    request_type, payload = connection.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    response: Any = self._stand_in._send_message(request_type, payload)
+                except ConnectionAbortedError as error:
+                    response = error
+                connection.send(response)
+
+
+class _ScMemoryClient(ScMemoryStandIn):
+    """Stand-in which forwards requests to the stand-in of other process, it can't subscribe to events"""
+
+    def __init__(self, address: Any, authkey: bytes) -> None:
+        super().__init__()
+        self._address = address
+        self._authkey = authkey
+        self._connection: Optional[Connection] = None
+
+    def _set_connection(self, url: str) -> None:
+        with self._lock:
+            self._connection = Client(self._address, authkey=self._authkey)
+            super()._set_connection(url)
+
+    def _close_connection(self) -> None:
+        with self._lock:
+            self._is_open = False
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+    def _send_message(self, request_type: RequestType, payload: Any) -> Dict[str, Any]:
+        with self._lock:
+            if self._connection is None:
+                raise ConnectionAbortedError("Sc-memory stand-in is not connected")
+            self._connection.send((request_type, payload))
+            response = self._connection.recv()
+        if isinstance(response, Exception):
+            raise response
+        return response
@@ -6,9 +6,12 @@ Distributed under the MIT License
 
 from abc import ABC, abstractmethod
 from logging import getLogger
-from typing import Set
+from typing import Optional, Set
 
-from sc_kpm.sc_agent import ScAgentAbstract
+from sc_kpm.sc_agent import ScAgentAbstract, _forgetting_subscriptions, _register_agents, _unregister_agents
+from sc_kpm.sc_agent_executor import ScAgentExecutor, ScProcessExecutor
+from sc_kpm.sc_agent_metrics import ScAgentMetricsInfo, combine_metrics
+from sc_kpm.sc_agent_profiler import ScAgentProfiler
 
 
 class ScModuleAbstract(ABC):
@@ -39,15 +42,39 @@ class ScModuleAbstract(ABC):
 
 
 class ScModule(ScModuleAbstract):
-    def __init__(self, *agents: ScAgentAbstract) -> None:
-        self._agents: Set[ScAgentAbstract] = {*agents}
+    def __init__(
+        self,
+        *agents: ScAgentAbstract,
+        executor: Optional[ScAgentExecutor] = None,
+        process_executor: Optional[ScProcessExecutor] = None,
+        profiler: Optional[ScAgentProfiler] = None,
+    ) -> None:
+        """
+        Initialize ScModule.
+
+        :param agents: Agents of the module.
+        :param executor: Optional worker pool for events of agents which have no own executor.
+        :param process_executor: Optional process pool for events of CPU-bound agents which have no own executor.
+        :param profiler: Optional profiler of activations of agents which have no own profiler.
+        """
+        self._agents: Set[ScAgentAbstract] = set()
+        self._executor = executor
+        self._process_executor = process_executor
+        self._profiler = profiler
         self._is_registered: bool = False
         self.logger = getLogger(f"{self.__module__}.{self.__class__.__name__}")
+        for agent in agents:
+            self.add_agent(agent)
 
     def __repr__(self) -> str:
         return f"{self.__class__.__name__}({', '.join(map(repr, self._agents))})"
 
     def add_agent(self, agent: ScAgentAbstract) -> None:
+        executor = self._process_executor if agent.is_cpu_bound else self._executor
+        if executor is not None and agent.executor is None:
+            agent.set_executor(executor)
+        if self._profiler is not None and agent.profiler is None:
+            agent.set_profiler(self._profiler)
         if self._is_registered:
             agent._register()  # pylint: disable=protected-access
         self._agents.add(agent)
@@ -57,19 +84,57 @@ class ScModule(ScModuleAbstract):
             agent._unregister()  # pylint: disable=protected-access
         self._agents.remove(agent)
 
+    @property
+    def agents(self) -> Set[ScAgentAbstract]:
+        return set(self._agents)
+
+    def metrics_info(self) -> ScAgentMetricsInfo:
+        """Roll up metrics of agents of the module"""
+        return combine_metrics(*(agent.metrics for agent in self._agents))
+
     def _register(self) -> None:
-        if self._is_registered:
-            self.logger.warning("Already registered")
-            return
-        if not self._agents:
-            self.logger.warning("No agents to register")
-        for agent in self._agents:
-            agent._register()  # pylint: disable=protected-access
-        self._is_registered = True
-        self.logger.info("Registered")
+        register_modules(self)
 
     def _unregister(self) -> None:
-        for agent in self._agents:
-            agent._unregister()  # pylint: disable=protected-access
-        self._is_registered = False
-        self.logger.info("Unregistered")
+        unregister_modules(self)
+
+
+def register_modules(*modules: ScModuleAbstract) -> None:
+    """Register agents of all ScModule objects in one request, other modules are registered one by one"""
+    # pylint: disable=protected-access
+    sc_modules = []
+    for module in modules:
+        if not isinstance(module, ScModule):
+            module._register()
+        elif module._is_registered:
+            module.logger.warning("Already registered")
+        else:
+            if not module._agents:
+                module.logger.warning("No agents to register")
+            sc_modules.append(module)
+    _register_agents(*(agent for module in sc_modules for agent in module._agents))
+    for module in sc_modules:
+        module._is_registered = True
+        module.logger.info("Registered")
+
+
+def unregister_modules(*modules: ScModuleAbstract, is_connection_lost: bool = False) -> None:
+    """
+    Unregister agents of all ScModule objects in one request, other modules are unregistered one by one.
+    If the connection was lost, subscriptions of agents are only forgotten without requests.
+    """
+    # pylint: disable=protected-access
+    sc_modules = []
+    for module in modules:
+        if isinstance(module, ScModule):
+            sc_modules.append(module)
+        elif is_connection_lost:
+            with _forgetting_subscriptions():
+                module._unregister()
+        else:
+            module._unregister()
+    agents = (agent for module in sc_modules for agent in module._agents)
+    _unregister_agents(*agents, is_connection_lost=is_connection_lost)
+    for module in sc_modules:
+        module._is_registered = False
+        module.logger.info("Unregistered")
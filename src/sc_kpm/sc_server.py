@@ -6,15 +6,26 @@ Distributed under the MIT License
 
 from __future__ import annotations
 
+import asyncio
+import random
 import signal
+import threading
 from abc import ABC, abstractmethod
+from http.server import ThreadingHTTPServer
 from logging import Logger, getLogger
-from typing import Callable
+from typing import Callable, Dict, List, NamedTuple, Optional
 
 from sc_client import client
+from sc_client.constants import sc_type
 
-from sc_kpm.identifiers import _IdentifiersResolver
-from sc_kpm.sc_module import ScModuleAbstract
+from sc_kpm.identifiers import ActionStatus, _IdentifiersResolver
+from sc_kpm.sc_agent import ScAgentAbstract, ScAgentClassic, _AsyncEventLoop, _InFlightEvents, _resolve_agents_keynodes
+from sc_kpm.sc_agent_metrics import ScAgentMetricsInfo, combine_metrics, start_metrics_server
+from sc_kpm.sc_keynodes import ScKeynodes, ScKeynodesContainer
+from sc_kpm.sc_memory import ScMemoryStandIn
+from sc_kpm.sc_module import ScModule, ScModuleAbstract, register_modules, unregister_modules
+from sc_kpm.utils.action_utils import _ActionsCompletion, finish_action_with_status
+from sc_kpm.utils.common_utils import check_connector
 
 
 class ScServerAbstract(ABC):
@@ -50,29 +61,197 @@ class ScServerAbstract(ABC):
         """Connect and register modules"""
 
     def stop(self) -> None:
-        """Disconnect and unregister modules"""
+        """Unregister modules, wait for handled events if it is enabled and disconnect"""
+
+    def drain(self) -> None:
+        """Stop accepting of new events of agents of modules and wait for handled ones until the drain timeout"""
+
+
+class ReconnectPolicy(NamedTuple):
+    """Policy of reconnection to the sc-server with exponential backoff and jitter"""
+
+    max_retries: int = 0  # 0 means that retries are unlimited
+    initial_delay: float = 0.5
+    max_delay: float = 30.0
+    multiplier: float = 2.0
+    jitter: float = 0.2  # Max deviation of the delay as a fraction of it
+    check_interval: float = 1.0  # Interval of the connection checking
+
+    def get_delay(self, attempt: int) -> float:
+        delay = min(self.max_delay, self.initial_delay * self.multiplier**attempt)
+        return delay * random.uniform(1 - self.jitter, 1 + self.jitter)
 
 
 class ScServer(ScServerAbstract):
-    def __init__(self, sc_server_url: str) -> None:
+    def __init__(
+        self,
+        sc_server_url: str,
+        keynodes_cache_path: Optional[str] = None,
+        reconnect_policy: Optional[ReconnectPolicy] = None,
+        drain_on_stop: bool = False,
+        drain_timeout: Optional[float] = 10.0,
+        finish_timed_out_actions: bool = False,
+    ) -> None:
+        """
+        Initialize ScServer.
+
+        :param sc_server_url: Url of the sc-server websocket.
+        Url memory:// (e.g. memory://?latency=0.002) connects to the in-process sc-memory stand-in.
+        :param keynodes_cache_path: Optional path to the sqlite file with keynodes saved on disconnect.
+        Saved keynodes are validated by types on connect instead of resolving them again.
+        :param reconnect_policy: Optional policy of supervised connection.
+        If it is given, lost connection is restored, subscriptions of registered modules are recreated
+        and keynodes are revalidated in the supervisor thread. Requests during the outage wait for the reconnection.
+        :param drain_on_stop: Drain events of agents of ScModule objects on stop.
+        Stop is blocked up to the drain timeout, events of agents of other modules aren't drained.
+        :param drain_timeout: Max time in seconds to wait for events handled by agents on drain, None means no limit.
+        :param finish_timed_out_actions: Finish actions of ScAgentClassic objects which weren't handled before
+        the drain timeout as unsuccessful ones.
+        """
         self._url: str = sc_server_url
+        self._keynodes_cache_path = keynodes_cache_path
+        self._reconnect_policy = reconnect_policy
+        self._drain_on_stop = drain_on_stop
+        self._drain_timeout = drain_timeout
+        self._finish_timed_out_actions = finish_timed_out_actions
         self._modules: set[ScModuleAbstract] = set()
         self.is_registered = False
+        self._is_available = threading.Event()
+        self._is_supervised = False
+        self._stop_supervision_event = threading.Event()
+        self._reconnection_lock = threading.Lock()
+        self._restoration_event = threading.Event()
+        self._supervisor: Optional[threading.Thread] = None
+        self._metrics_server: Optional[ThreadingHTTPServer] = None
         self.logger = getLogger(f"{self.__module__}.{self.__class__.__name__}")
 
     def __repr__(self) -> str:
         return f"{self.__class__.__name__}({', '.join(map(repr, self._modules))})"
 
     def connect(self) -> _Finisher:
+        if ScMemoryStandIn.is_memory_url(self._url):
+            ScMemoryStandIn.from_url(self._url).install()
         client.connect(self._url)
+        _InFlightEvents.accept(self._get_agents(*self._modules))
         self.logger.info("Connected by url: %s", repr(self._url))
+        if self._keynodes_cache_path is not None:
+            ScKeynodes.load(self._keynodes_cache_path, self._url)
         _IdentifiersResolver.resolve()
+        ScKeynodesContainer.resolve_all()
+        ScKeynodes._subscribe_to_erasure()  # pylint: disable=protected-access
+        self._is_available.set()
+        if self._reconnect_policy is not None:
+            self._start_supervision()
         return _Finisher(self.disconnect, self.logger)
 
     def disconnect(self) -> None:
+        self._stop_supervision()
+        self._is_available.clear()
+        if self._keynodes_cache_path is not None and client.is_connected():
+            ScKeynodes.save(self._keynodes_cache_path, self._url)
+        ScKeynodes._unsubscribe_from_erasure()  # pylint: disable=protected-access
+        _ActionsCompletion._unsubscribe()  # pylint: disable=protected-access
         client.disconnect()
+        if ScMemoryStandIn.is_memory_url(self._url):
+            ScMemoryStandIn.from_url(self._url).uninstall()  # Later connections to other urls use the sc-server
         self.logger.info("Disconnected from url: %s", repr(self._url))
 
+    @property
+    def is_connection_lost(self) -> bool:
+        """Connection is supervised and it is being restored"""
+        return self._is_supervised and not self._is_available.is_set()
+
+    def wait_connection(self, timeout: Optional[float] = None) -> bool:
+        """Wait until the connection is available and restored, return False on timeout"""
+        return self._is_available.wait(timeout)
+
+    def _start_supervision(self) -> None:
+        client.set_reconnect_handler(
+            reconnect_handler=self._reconnect,
+            post_reconnect_handler=lambda: None,
+            reconnect_retries=1,
+            reconnect_retry_delay=0,
+        )
+        self._is_supervised = True
+        self._stop_supervision_event.clear()
+        self._supervisor = threading.Thread(target=self._supervise, name="sc-server-supervisor", daemon=True)
+        self._supervisor.start()
+
+    def _stop_supervision(self) -> None:
+        if not self._is_supervised:
+            return
+        self._is_supervised = False
+        self._stop_supervision_event.set()
+        self._restoration_event.set()
+        if self._supervisor is not None and self._supervisor is not threading.current_thread():
+            self._supervisor.join()
+        self._supervisor = None
+        client.set_reconnect_handler(post_reconnect_handler=lambda: None)
+
+    def _supervise(self) -> None:
+        """Check the connection and restore state after reconnections made by failed requests"""
+        while not self._stop_supervision_event.is_set():
+            self._restoration_event.wait(self._reconnect_policy.check_interval)
+            self._restoration_event.clear()
+            if self._stop_supervision_event.is_set():
+                return
+            if not client.is_connected():
+                self._reconnect()
+            if client.is_connected() and not self._is_available.is_set():
+                self._recover()
+
+    def _reconnect(self) -> None:
+        """
+        Reconnect with backoff and wake the supervisor to restore state.
+        It's the reconnect handler of sc-client called by the failed request, so the state isn't restored here:
+        the request can hold locks and in-flight keynodes needed for restoration.
+        """
+        with self._reconnection_lock:
+            if not self._is_supervised or client.is_connected():
+                return
+            self._is_available.clear()
+            self.logger.warning("Connection to %s lost, reconnecting", repr(self._url))
+            attempt = 0
+            while not client.is_connected():
+                client.connect(self._url)
+                if client.is_connected():
+                    break
+                attempt += 1
+                if self._reconnect_policy.max_retries and attempt >= self._reconnect_policy.max_retries:
+                    self.logger.error("Failed to reconnect to %s after %d attempts", repr(self._url), attempt)
+                    return
+                delay = self._reconnect_policy.get_delay(attempt - 1)
+                self.logger.info("Reconnection attempt %d failed, next one in %.2f seconds", attempt, delay)
+                if self._stop_supervision_event.wait(delay):
+                    return
+            self.logger.info("Reconnected to %s after %d failed attempts", repr(self._url), attempt)
+        self._restoration_event.set()
+
+    def _recover(self) -> None:
+        """Recreate subscriptions and revalidate keynodes in the supervisor thread after reconnection"""
+        try:
+            self._restore()
+        except Exception as error:  # pylint: disable=broad-exception-caught
+            self.logger.error("Failed to restore state after reconnection: %s", repr(error))
+            return
+        if self._restoration_event.is_set():
+            return  # Connection was lost again during restoration, so it's restored once more
+        self._is_available.set()
+        self.logger.info("Restored state after reconnection to %s", repr(self._url))
+
+    def _restore(self) -> None:
+        ScKeynodes._revalidate()  # pylint: disable=protected-access
+        _IdentifiersResolver.is_resolved = False
+        _IdentifiersResolver.resolve()
+        ScKeynodesContainer._invalidate_all()  # pylint: disable=protected-access
+        ScKeynodesContainer.resolve_all()
+        _ActionsCompletion._resubscribe()  # pylint: disable=protected-access
+        if self.is_registered:
+            unregister_modules(*self._modules, is_connection_lost=True)
+            # Keynodes of agents could be outdated by the revalidation
+            _resolve_agents_keynodes(*self._get_agents(*self._modules))
+            register_modules(*self._modules)
+
     def add_modules(self, *modules: ScModuleAbstract) -> None:
         if self.is_registered:
             self._register(*modules)
@@ -115,8 +294,25 @@ class ScServer(ScServerAbstract):
 
     def stop(self) -> None:
         self.unregister_modules()
+        if self._drain_on_stop:
+            self.drain()
         self.disconnect()
 
+    def drain(self) -> None:
+        self.logger.info("Draining handled events")
+        unfinished_events = _InFlightEvents.drain(self._get_agents(*self._modules), self._drain_timeout)
+        if not unfinished_events:
+            self.logger.info("Drained all handled events")
+            return
+        self.logger.warning("%d events weren't handled before the drain timeout", len(unfinished_events))
+        if not self._finish_timed_out_actions or not client.is_connected():
+            return
+        actions = {action for agent, action in unfinished_events if isinstance(agent, ScAgentClassic)}
+        for action in actions:
+            if not check_connector(sc_type.VAR_PERM_POS_ARC, ScKeynodes[ActionStatus.ACTION_FINISHED], action):
+                finish_action_with_status(action, is_success=False)
+                self.logger.warning("Finished timed out action %s unsuccessfully", repr(action))
+
     def _register(self, *modules: ScModuleAbstract) -> None:
         if not client.is_connected():
             self.logger.error("Failed to register: connection lost")
@@ -125,20 +321,106 @@ class ScServer(ScServerAbstract):
             if not isinstance(module, ScModuleAbstract):
                 self.logger.error("Failed to register: type of %s is not ScModule", repr(module))
                 raise TypeError(f"{repr(module)} is not ScModule")
-            module._register()  # pylint: disable=protected-access
+        _InFlightEvents.accept(self._get_agents(*modules))
+        register_modules(*modules)
 
     def _unregister(self, *modules: ScModuleAbstract) -> None:
         if not client.is_connected():
             self.logger.error("Failed to unregister: connection to %s lost", repr(self._url))
             raise ConnectionError(f"Connection to {repr(self._url)} lost")
-        for module in modules:
-            module._unregister()  # pylint: disable=protected-access
+        unregister_modules(*modules)
+
+    @staticmethod
+    def _get_agents(*modules: ScModuleAbstract) -> List[ScAgentAbstract]:
+        """Get agents of ScModule objects, agents of other modules are unknown"""
+        return [agent for module in modules if isinstance(module, ScModule) for agent in module.agents]
+
+    def agents_metrics(self) -> Dict[str, ScAgentMetricsInfo]:
+        """Get snapshot of metrics of agents of ScModule objects, agents with the same repr are rolled up"""
+        agents: Dict[str, List[ScAgentAbstract]] = {}
+        for module in self._modules:
+            if isinstance(module, ScModule):
+                for agent in module.agents:
+                    agents.setdefault(repr(agent), []).append(agent)
+        return {
+            name: combine_metrics(*(agent.metrics for agent in same_agents)) for name, same_agents in agents.items()
+        }
+
+    def metrics_info(self) -> ScAgentMetricsInfo:
+        """Roll up metrics of all agents of ScModule objects"""
+        modules = [module for module in self._modules if isinstance(module, ScModule)]
+        return combine_metrics(*(agent.metrics for module in modules for agent in module.agents))
+
+    def start_metrics_endpoint(self, port: int = 9464, host: str = "127.0.0.1") -> _Finisher:
+        """Serve metrics of agents in the Prometheus text format on http://host:port/metrics"""
+        if self._metrics_server is not None:
+            self.logger.warning("Metrics endpoint is already started")
+        else:
+            self._metrics_server = start_metrics_server(self.agents_metrics, host, port)
+            self.logger.info("Started metrics endpoint: %s", self.metrics_url)
+        return _Finisher(self.stop_metrics_endpoint, self.logger)
+
+    def stop_metrics_endpoint(self) -> None:
+        metrics_server, self._metrics_server = self._metrics_server, None
+        if metrics_server is not None:
+            metrics_server.shutdown()
+            metrics_server.server_close()
+            self.logger.info("Stopped metrics endpoint")
+
+    @property
+    def metrics_url(self) -> Optional[str]:
+        if self._metrics_server is None:
+            return None
+        host, port = self._metrics_server.server_address[:2]
+        return f"http://{host}:{port}/metrics"
 
     def serve(self) -> None:
-        """Serve agents until a SIGINT signal (^C, or stop in IDE) is received"""
-
-        signal.signal(signal.SIGINT, lambda *_: self.logger.info("^C SIGINT was interrupted"))
-        signal.pause()
+        """Serve agents until a SIGINT (^C, or stop in IDE) or SIGTERM signal is received"""
+        stop_event = threading.Event()
+
+        def handle_signal(signal_number: int, _) -> None:
+            self.logger.info("%s was received", signal.Signals(signal_number).name)
+            stop_event.set()
+
+        previous_handlers = {
+            signal_number: signal.signal(signal_number, handle_signal) for signal_number in _STOP_SIGNALS
+        }
+        try:
+            while not stop_event.wait(_SIGNALS_POLL_INTERVAL):
+                pass  # The wait is polled, so the main thread runs the signal handler
+        finally:
+            for signal_number, handler in previous_handlers.items():
+                signal.signal(signal_number, handler)
+
+    async def serve_async(self, max_concurrent_events: int = 100) -> None:
+        """
+        Serve agents until a SIGINT or SIGTERM signal is received or the task is cancelled.
+        Events of async agents are handled as tasks of the running event loop, at most max_concurrent_events at once.
+        Unfinished tasks are awaited before return.
+        """
+        loop = asyncio.get_running_loop()
+        stop_event = asyncio.Event()
+        handled_signals = []
+        for signal_number in _STOP_SIGNALS:
+            try:
+                loop.add_signal_handler(signal_number, stop_event.set)
+                handled_signals.append(signal_number)
+            except (NotImplementedError, RuntimeError, ValueError):  # Not main thread or Windows
+                break
+        _AsyncEventLoop.start(max_concurrent_events)
+        self.logger.info("Serving async agents")
+        try:
+            await stop_event.wait()
+            self.logger.info("Stop signal was received")
+        finally:
+            for signal_number in handled_signals:
+                loop.remove_signal_handler(signal_number)
+            await _AsyncEventLoop.stop()
+            self.logger.info("Stopped serving async agents")
+
+
+_STOP_SIGNALS = (signal.SIGINT, signal.SIGTERM)
+_SIGNALS_POLL_INTERVAL = 0.5
 
 
 class _Finisher:
@@ -20,13 +20,15 @@ class ScNumberedSet(ScSet):
         """Add elements to ScNumberedSet"""
         if elements:
             template = ScTemplate()
-            for index, element in enumerate(elements, len(self) + 1):
+            start = len(self) + 1
+            rrel_nodes = ScKeynodes.rrel_indices(start, start + len(elements))
+            for element, rrel_node in zip(elements, rrel_nodes):
                 template.quintuple(
                     self._set_node,
                     sc_type.VAR_PERM_POS_ARC,
                     element,
                     sc_type.VAR_PERM_POS_ARC,
-                    ScKeynodes.rrel_index(index),
+                    rrel_node,
                 )
             generate_by_template(template)
 
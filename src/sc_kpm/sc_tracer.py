@@ -0,0 +1,193 @@
+"""
+This source file is part of an OSTIS project. For the latest info, see https://github.com/ostis-ai
+Distributed under the MIT License
+(See an accompanying file LICENSE or a copy at https://opensource.org/licenses/MIT)
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Deque, Dict, Iterator, List, NamedTuple, Tuple
+
+import sc_client
+from sc_client import session
+from sc_client.constants.common import ClientCommand
+
+RequestObserver = Callable[[ClientCommand, Tuple[Any, ...], float], None]
+
+_SC_CLIENT_DIR = os.path.dirname(sc_client.__file__)
+_SC_KPM_DIR = os.path.dirname(__file__)
+
+
+class _RequestHooks:
+    """Observers of requests of the sc-client, the session is wrapped once when the first observer is added"""
+
+    lock = threading.Lock()
+    observers: Tuple[RequestObserver, ...] = ()
+    _original_execute: Callable[..., Any] = session.execute
+    _is_installed = False
+
+    @classmethod
+    def add(cls, observer: RequestObserver) -> None:
+        with cls.lock:
+            if not cls._is_installed:
+                cls._original_execute = session.execute
+                session.execute = cls._execute
+                cls._is_installed = True
+            if observer not in cls.observers:
+                cls.observers = (*cls.observers, observer)
+
+    @classmethod
+    def remove(cls, observer: RequestObserver) -> None:
+        with cls.lock:
+            cls.observers = tuple(other for other in cls.observers if other != observer)
+
+    @classmethod
+    def _execute(cls, request_type: ClientCommand, *args: Any) -> Any:
+        observers = cls.observers
+        if not observers:
+            return cls._original_execute(request_type, *args)
+        start = time.perf_counter()
+        try:
+            return cls._original_execute(request_type, *args)
+        finally:
+            duration = time.perf_counter() - start
+            for observer in observers:
+                observer(request_type, args, duration)
+
+
+class TracedRequest(NamedTuple):
+    kind: str  # Name of the sc-client command
+    payload_size: int  # Size of the request payload in bytes
+    latency: float
+    site: str  # The nearest caller of the sc-client, e.g. sc_kpm util
+    origin: str  # The nearest caller outside sc_kpm
+
+
+class RoundTripsBudgetError(AssertionError):
+    pass
+
+
+_active_tracers: ContextVar[Tuple["ScTracer", ...]] = ContextVar("sc_kpm_active_tracers", default=())
+
+
+class ScTracer:
+    """
+    Opt-in tracer of requests to the sc-server.
+    By default it traces requests of the current context (thread or task and to_thread calls from it),
+    with all_threads=True it traces requests of agents and other threads too.
+    """
+
+    _global_tracers: Tuple["ScTracer", ...] = ()
+
+    def __init__(self, all_threads: bool = False, max_requests: int = 10000) -> None:
+        """
+        Initialize ScTracer.
+
+        :param all_threads: Trace requests of all threads instead of the current context.
+        :param max_requests: Number of recent requests which are kept.
+        """
+        self._all_threads = all_threads
+        self._lock = threading.Lock()
+        self._requests: Deque[TracedRequest] = deque(maxlen=max_requests)
+        self._round_trips = 0
+        self._token: Any = None
+
+    def __enter__(self) -> "ScTracer":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        _RequestHooks.add(_trace_request)
+        if self._all_threads:
+            with _RequestHooks.lock:
+                ScTracer._global_tracers = (*ScTracer._global_tracers, self)
+        else:
+            self._token = _active_tracers.set((*_active_tracers.get(), self))
+
+    def stop(self) -> None:
+        if self._all_threads:
+            with _RequestHooks.lock:
+                ScTracer._global_tracers = tuple(tracer for tracer in ScTracer._global_tracers if tracer is not self)
+        elif self._token is not None:
+            _active_tracers.reset(self._token)
+            self._token = None
+
+    @property
+    def round_trips(self) -> int:
+        return self._round_trips
+
+    @property
+    def requests(self) -> List[TracedRequest]:
+        with self._lock:
+            return list(self._requests)
+
+    def summary(self) -> Dict[str, Tuple[int, float]]:
+        """Get number of requests and their total latency by kinds"""
+        summary: Dict[str, Tuple[int, float]] = {}
+        for request in self.requests:
+            count, latency = summary.get(request.kind, (0, 0.0))
+            summary[request.kind] = (count + 1, latency + request.latency)
+        return summary
+
+    def clear(self) -> None:
+        with self._lock:
+            self._requests.clear()
+            self._round_trips = 0
+
+    def _add(self, request: TracedRequest) -> None:
+        with self._lock:
+            self._requests.append(request)
+            self._round_trips += 1
+
+
+def _trace_request(request_type: ClientCommand, args: Tuple[Any, ...], latency: float) -> None:
+    tracers = (*_active_tracers.get(), *ScTracer._global_tracers)  # pylint: disable=protected-access
+    if not tracers:
+        return
+    site, origin = _get_call_sites()
+    request = TracedRequest(request_type.name, _get_payload_size(request_type, args), latency, site, origin)
+    for tracer in tracers:
+        tracer._add(request)  # pylint: disable=protected-access
+
+
+def _get_payload_size(request_type: ClientCommand, args: Tuple[Any, ...]) -> int:
+    executor = session._ScClientSession.executor  # pylint: disable=protected-access
+    try:
+        return len(json.dumps(executor.payload_factory.run(request_type, *args)).encode())
+    except Exception:  # pylint: disable=broad-exception-caught
+        return 0
+
+
+def _get_call_sites() -> Tuple[str, str]:
+    frame = sys._getframe(1)  # pylint: disable=protected-access
+    site = origin = ""
+    while frame is not None and not origin:
+        filename = frame.f_code.co_filename
+        if not filename.startswith(_SC_CLIENT_DIR) and filename != __file__:
+            location = f"{filename}:{frame.f_lineno} in {frame.f_code.co_name}"
+            site = site or location
+            if not filename.startswith(_SC_KPM_DIR):
+                origin = location
+        frame = frame.f_back
+    return site, origin
+
+
+@contextmanager
+def max_round_trips(count: int) -> Iterator[ScTracer]:
+    """Trace requests of the block and raise RoundTripsBudgetError if their number is bigger than count"""
+    with ScTracer() as tracer:
+        yield tracer
+    if tracer.round_trips > count:
+        requests = "\n".join(f"  {request.kind} from {request.site}" for request in tracer.requests)
+        raise RoundTripsBudgetError(
+            f"{tracer.round_trips} round trips to the sc-server exceed the budget of {count}:\n{requests}"
+        )
@@ -33,6 +33,7 @@ from sc_kpm.utils.common_utils import (
     get_element_by_norole_relation,
     get_element_by_role_relation,
     get_element_system_identifier,
+    get_elements_system_identifiers,
     get_link_content_data,
     get_system_idtf,
     search_connector,
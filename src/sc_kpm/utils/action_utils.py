@@ -4,31 +4,33 @@ Distributed under the MIT License
 (See an accompanying file LICENSE or a copy at https://opensource.org/licenses/MIT)
 """
 
+import threading
+import time
 import warnings
+from contextlib import contextmanager
+from enum import Enum
+from functools import partial
+from queue import Empty, Queue
 from threading import Event
-from typing import Dict, List, Tuple, Union
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple, Union
 
-from sc_client import client
+from sc_client import client, session
 from sc_client.client import create_elementary_event_subscriptions, destroy_elementary_event_subscriptions
-from sc_client.constants import sc_type
+from sc_client.constants import ScType, sc_type
 from sc_client.constants.common import ScEventType
-from sc_client.models import ScAddr, ScConstruction, ScEventSubscriptionParams, ScTemplate
+from sc_client.models import ScAddr, ScConstruction, ScEventSubscription, ScEventSubscriptionParams, ScTemplate
 
 from sc_kpm.identifiers import ActionStatus, CommonIdentifiers, ScAlias
 from sc_kpm.sc_keynodes import Idtf, ScKeynodes
 from sc_kpm.sc_result import ScResult
 from sc_kpm.sc_sets.sc_structure import ScStructure
-from sc_kpm.utils.common_utils import (
-    check_connector,
-    generate_connector,
-    generate_node,
-    generate_non_role_relation,
-    generate_role_relation,
-    search_element_by_role_relation,
-)
+from sc_kpm.utils.common_utils import check_connector, generate_connector, generate_non_role_relation
 
 COMMON_WAIT_TIME: float = 5
 
+_ROLE_RELATION = "_role_relation"
+_DYNAMIC_ARGUMENT_VALUE = "_dynamic_argument_value"
+
 
 def check_action_class(action_class: Union[ScAddr, Idtf], action_node: ScAddr) -> bool:
     action_class = ScKeynodes[action_class] if isinstance(action_class, Idtf) else action_class
@@ -39,14 +41,56 @@ def check_action_class(action_class: Union[ScAddr, Idtf], action_node: ScAddr) -
     return len(search_results) > 0
 
 
-def get_action_arguments(action_node: ScAddr, count: int) -> List[ScAddr]:
-    arguments = []
-    for index in range(1, count + 1):
-        argument = search_element_by_role_relation(action_node, ScKeynodes.rrel_index(index))
-        arguments.append(argument)
+def get_action_arguments(action_node: ScAddr, count: int, dereference_dynamic: bool = False) -> List[ScAddr]:
+    """
+    Get arguments of the action by rrel_1 ... rrel_count with one search, missing arguments are ScAddr(0).
+    If dereference_dynamic is True, values of dynamic arguments are returned instead of their nodes,
+    they are searched with one more request if the action has dynamic arguments.
+    """
+    rrel_indices = {rrel_node: index for index, rrel_node in enumerate(ScKeynodes.rrel_indices(1, count + 1))}
+    rrel_dynamic_arg = ScKeynodes[CommonIdentifiers.RREL_DYNAMIC_ARGUMENT]
+    templ = ScTemplate()
+    templ.quintuple(
+        action_node,
+        sc_type.VAR_PERM_POS_ARC >> ScAlias.RELATION_ARC,
+        sc_type.UNKNOWN >> ScAlias.ELEMENT,
+        sc_type.VAR_PERM_POS_ARC,
+        sc_type.VAR_NODE_ROLE >> _ROLE_RELATION,
+    )
+    arguments = [ScAddr(0)] * count
+    argument_arcs = [ScAddr(0)] * count
+    dynamic_arcs = set()
+    for result in client.search_by_template(templ):
+        role_relation = result.get(_ROLE_RELATION)
+        if role_relation == rrel_dynamic_arg:
+            dynamic_arcs.add(result.get(ScAlias.RELATION_ARC))
+        elif role_relation in rrel_indices:
+            arguments[rrel_indices[role_relation]] = result.get(ScAlias.ELEMENT)
+            argument_arcs[rrel_indices[role_relation]] = result.get(ScAlias.RELATION_ARC)
+    if dereference_dynamic and dynamic_arcs.intersection(argument_arcs):
+        values = _search_dynamic_arguments_values(action_node, rrel_dynamic_arg)
+        arguments = [
+            values.get(argument, ScAddr(0)) if arc in dynamic_arcs else argument
+            for argument, arc in zip(arguments, argument_arcs)
+        ]
     return arguments
 
 
+def _search_dynamic_arguments_values(action_node: ScAddr, rrel_dynamic_arg: ScAddr) -> Dict[ScAddr, ScAddr]:
+    templ = ScTemplate()
+    templ.quintuple(
+        action_node,
+        sc_type.VAR_PERM_POS_ARC >> ScAlias.RELATION_ARC,
+        sc_type.VAR_NODE >> ScAlias.ELEMENT,
+        sc_type.VAR_PERM_POS_ARC,
+        rrel_dynamic_arg,
+    )
+    templ.triple(ScAlias.ELEMENT, sc_type.VAR_TEMP_POS_ARC, sc_type.UNKNOWN >> _DYNAMIC_ARGUMENT_VALUE)
+    return {
+        result.get(ScAlias.ELEMENT): result.get(_DYNAMIC_ARGUMENT_VALUE) for result in client.search_by_template(templ)
+    }
+
+
 def generate_action_result(action_node: ScAddr, *elements: ScAddr) -> None:
     result_struct_node = ScStructure(*elements).set_node
     generate_non_role_relation(action_node, result_struct_node, ScKeynodes[CommonIdentifiers.NREL_RESULT])
@@ -95,23 +139,47 @@ def call_agent(
     concepts: List[Idtf],
     initiation: Idtf = ActionStatus.ACTION_INITIATED,
 ) -> ScAddr:
-    action = generate_action(*concepts)
-    add_action_arguments(action, arguments)
-    call_action(action, initiation)
-    return action
+    """Generate the action with arguments and initiate it in one request"""
+    ScKeynodes.prefetch(_get_concepts_types(*concepts, initiation))
+    construction = ScConstruction()
+    _add_action_call_to_construction(construction, ScAlias.ACTION_NODE, arguments, concepts, initiation)
+    return client.generate_elements(construction)[0]
 
 
 def generate_action(*concepts: Idtf) -> ScAddr:
+    ScKeynodes.prefetch(_get_concepts_types(*concepts))
     construction = ScConstruction()
-    construction.generate_node(sc_type.CONST_NODE, ScAlias.ACTION_NODE)
+    _add_action_to_construction(construction, ScAlias.ACTION_NODE, concepts)
+    action_node = client.generate_elements(construction)[0]
+    return action_node
+
+
+def _get_concepts_types(*concepts: Idtf) -> Dict[Idtf, ScType]:
+    return {concept: sc_type.CONST_NODE_CLASS for concept in concepts}
+
+
+def _add_action_to_construction(construction: ScConstruction, action_alias: str, concepts: Iterable[Idtf]) -> None:
+    construction.generate_node(sc_type.CONST_NODE, action_alias)
     for concept in concepts:
         construction.generate_connector(
             sc_type.CONST_PERM_POS_ARC,
             ScKeynodes.resolve(concept, sc_type.CONST_NODE_CLASS),
-            ScAlias.ACTION_NODE,
+            action_alias,
         )
-    action_node = client.generate_elements(construction)[0]
-    return action_node
+
+
+def _add_action_call_to_construction(
+    construction: ScConstruction,
+    action_alias: str,
+    arguments: Dict[ScAddr, IsDynamic],
+    concepts: Iterable[Idtf],
+    initiation: Idtf,
+) -> None:
+    _add_action_to_construction(construction, action_alias, concepts)
+    _add_arguments_to_construction(construction, action_alias, arguments, alias_prefix=action_alias)
+    # The initiation arc is the last one, so agents get the action with all arguments
+    initiation_node = ScKeynodes.resolve(initiation, sc_type.CONST_NODE_CLASS)
+    construction.generate_connector(sc_type.CONST_PERM_POS_ARC, initiation_node, action_alias)
 
 
 def create_action(*concepts: Idtf) -> ScAddr:
@@ -123,17 +191,32 @@ def create_action(*concepts: Idtf) -> ScAddr:
 
 
 def add_action_arguments(action_node: ScAddr, arguments: Dict[ScAddr, IsDynamic]) -> None:
+    construction = ScConstruction()
+    _add_arguments_to_construction(construction, action_node, arguments)
+    if construction.commands:
+        client.generate_elements(construction)
+
+
+def _add_arguments_to_construction(
+    construction: ScConstruction, action: Union[ScAddr, str], arguments: Dict[ScAddr, IsDynamic], alias_prefix: str = ""
+) -> None:
     rrel_dynamic_arg = ScKeynodes[CommonIdentifiers.RREL_DYNAMIC_ARGUMENT]
+    rrel_nodes = ScKeynodes.rrel_indices(1, len(arguments) + 1)
     argument: ScAddr
-    for index, (argument, is_dynamic) in enumerate(arguments.items(), 1):
-        if argument.is_valid():
-            rrel_i = ScKeynodes.rrel_index(index)
-            if is_dynamic:
-                dynamic_node = generate_node(sc_type.CONST_NODE)
-                generate_role_relation(action_node, dynamic_node, rrel_dynamic_arg, rrel_i)
-                generate_connector(sc_type.CONST_TEMP_POS_ARC, dynamic_node, argument)
-            else:
-                generate_role_relation(action_node, argument, rrel_i)
+    for index, ((argument, is_dynamic), rrel_i) in enumerate(zip(arguments.items(), rrel_nodes), 1):
+        if not argument.is_valid():
+            continue
+        argument_arc = f"{alias_prefix}_argument_arc_{index}"
+        if is_dynamic:
+            dynamic_node = f"{alias_prefix}_dynamic_argument_{index}"
+            construction.generate_node(sc_type.CONST_NODE, dynamic_node)
+            construction.generate_connector(sc_type.CONST_PERM_POS_ARC, action, dynamic_node, argument_arc)
+            construction.generate_connector(sc_type.CONST_PERM_POS_ARC, rrel_dynamic_arg, argument_arc)
+            construction.generate_connector(sc_type.CONST_PERM_POS_ARC, rrel_i, argument_arc)
+            construction.generate_connector(sc_type.CONST_TEMP_POS_ARC, dynamic_node, argument)
+        else:
+            construction.generate_connector(sc_type.CONST_PERM_POS_ARC, action, argument, argument_arc)
+            construction.generate_connector(sc_type.CONST_PERM_POS_ARC, rrel_i, argument_arc)
 
 
 def execute_action(
@@ -153,22 +236,275 @@ def call_action(action_node: ScAddr, initiation: Idtf = ActionStatus.ACTION_INIT
     generate_connector(sc_type.CONST_PERM_POS_ARC, initiation_node, action_node)
 
 
-def wait_agent(seconds: float, action_node: ScAddr, reaction_node: ScAddr = None) -> None:
+def wait_agent(seconds: float, action_node: ScAddr, reaction_node: ScAddr = None) -> bool:
+    """Wait for generation of the arc from the reaction node and return True if it is generated in time"""
     reaction_node = reaction_node or ScKeynodes[ActionStatus.ACTION_FINISHED]
     finish_event = Event()
+    _ActionsCompletion.add(reaction_node, action_node, finish_event.set)
+    try:
+        if check_connector(sc_type.VAR_PERM_POS_ARC, reaction_node, action_node):
+            return True
+        return finish_event.wait(seconds)
+    finally:
+        _ActionsCompletion.remove(reaction_node, action_node, finish_event.set)
+
+
+def _get_connection() -> Any:
+    """Get the websocket app of sc-client, it's created for each connection"""
+    return session._ScClientSession.ws_app  # pylint: disable=protected-access
+
+
+class _ActionsCompletion:
+    """
+    Process-wide waiters of actions finish.
+    Each reaction node has one long-lived subscription which wakes waiters of actions,
+    so waits don't create subscriptions for each action.
+    """
+
+    _lock = threading.Lock()
+    _subscription_lock = threading.Lock()
+    _subscriptions: Dict[ScAddr, ScEventSubscription] = {}  # Reaction node -> subscription
+    _waiters: Dict[Tuple[ScAddr, ScAddr], List[Callable[[], None]]] = {}  # Reaction and action nodes -> callbacks
+    _connection: Any = None  # Connection of the subscriptions
+    _captures = 0
+    _captured: Set[Tuple[ScAddr, ScAddr]] = set()  # Reactions without waiters while actions are generated
+
+    @classmethod
+    def add(cls, reaction_node: ScAddr, action_node: ScAddr, callback: Callable[[], None]) -> None:
+        """Call the callback once when the arc from the reaction node to the action node is generated"""
+        with cls._lock:
+            is_captured = (reaction_node, action_node) in cls._captured
+            if is_captured:
+                cls._captured.discard((reaction_node, action_node))
+            else:
+                cls._waiters.setdefault((reaction_node, action_node), []).append(callback)
+        if is_captured:
+            callback()
+            return
+        cls._subscribe(reaction_node)
+
+    @classmethod
+    @contextmanager
+    def capture(cls, *reaction_nodes: ScAddr) -> Iterator[None]:
+        """Keep reactions without waiters, so waiters of actions generated in the block don't miss them"""
+        for reaction_node in reaction_nodes:
+            cls._subscribe(reaction_node)
+        with cls._lock:
+            cls._captures += 1
+        try:
+            yield
+        finally:
+            with cls._lock:
+                cls._captures -= 1
+                if not cls._captures:
+                    cls._captured.clear()
+
+    @classmethod
+    def remove(cls, reaction_node: ScAddr, action_node: ScAddr, callback: Callable[[], None]) -> None:
+        with cls._lock:
+            callbacks = cls._waiters.get((reaction_node, action_node), [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+            if not callbacks:
+                cls._waiters.pop((reaction_node, action_node), None)
+
+    @classmethod
+    def _subscribe(cls, reaction_node: ScAddr) -> None:
+        """Create the subscription outside the lock, so a reconnection in the request doesn't wait for it"""
+        if cls._is_subscribed(reaction_node):
+            return
+        with cls._subscription_lock:
+            connection = _get_connection()
+            if cls._connection is not connection:
+                cls._subscriptions.clear()  # They were destroyed with the previous connection
+                cls._connection = connection
+            if cls._is_subscribed(reaction_node):
+                return
+        params = ScEventSubscriptionParams(reaction_node, ScEventType.AFTER_GENERATE_OUTGOING_ARC, cls._on_reaction)
+        subscription = create_elementary_event_subscriptions(params)[0]
+        with cls._subscription_lock:
+            is_current = cls._connection is connection is _get_connection()
+            is_duplicate = is_current and cls._is_subscribed(reaction_node)
+            if is_current and not is_duplicate:
+                cls._subscriptions[reaction_node] = subscription
+        if is_duplicate:  # Another thread has subscribed to the reaction node at the same time
+            destroy_elementary_event_subscriptions(subscription)
+
+    @classmethod
+    def _is_subscribed(cls, reaction_node: ScAddr) -> bool:
+        """Subscription is created with the current connection, e.g. after reconnection of sc-client itself"""
+        subscription = cls._subscriptions.get(reaction_node)
+        return (
+            subscription is not None
+            and cls._connection is _get_connection()
+            and client.is_event_subscription_valid(subscription)
+        )
+
+    @classmethod
+    def _unsubscribe(cls) -> None:
+        """Destroy all subscriptions of the current connection in one request"""
+        with cls._subscription_lock:
+            subscriptions = list(cls._subscriptions.values())
+            is_current = cls._connection is _get_connection()
+            cls._subscriptions.clear()
+        if subscriptions and is_current and client.is_connected():
+            destroy_elementary_event_subscriptions(*subscriptions)
+
+    @classmethod
+    def _resubscribe(cls) -> None:
+        """Recreate subscriptions of waited reactions after reconnection"""
+        with cls._subscription_lock:
+            cls._subscriptions.clear()  # They were destroyed with the connection
+        with cls._lock:
+            reaction_nodes = {reaction_node for reaction_node, _ in cls._waiters}
+        for reaction_node in reaction_nodes:
+            cls._subscribe(reaction_node)
+
+    @classmethod
+    def _on_reaction(cls, reaction_node: ScAddr, _: ScAddr, action_node: ScAddr) -> ScResult:
+        with cls._lock:
+            callbacks = cls._waiters.pop((reaction_node, action_node), [])
+            if not callbacks and cls._captures:
+                cls._captured.add((reaction_node, action_node))
+        for callback in callbacks:
+            callback()
+        return ScResult.OK if callbacks else ScResult.SKIP
+
+
+class ActionOutcome(Enum):
+    SUCCESSFUL = "successful"
+    UNSUCCESSFUL = "unsuccessful"
+    TIMED_OUT = "timed_out"
+
+
+class ActionSpec(NamedTuple):
+    arguments: Dict[ScAddr, IsDynamic]
+    concepts: List[Idtf]
+    initiation: Idtf = ActionStatus.ACTION_INITIATED
+
+
+class ActionFuture:
+    """Finish of the submitted action, futures are completed by the shared subscriptions of action statuses"""
+
+    def __init__(self, action_node: ScAddr) -> None:
+        self.action_node = action_node
+        self.submitted = time.monotonic()
+        self._lock = threading.Lock()
+        self._finished = Event()
+        self._is_successful: Optional[bool] = None  # Status if its arc is generated before the finish
+        self._outcome: Optional[ActionOutcome] = None
+        self._callbacks: List[Callable[["ActionFuture"], None]] = []
+        success_node, failure_node, finish_node = _get_status_nodes()
+        self._reactions = {
+            success_node: partial(self._set_status, True),
+            failure_node: partial(self._set_status, False),
+            finish_node: partial(self._complete, None),
+        }
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(action_node={self.action_node}, done={self.done()})"
+
+    def done(self) -> bool:
+        return self._finished.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait for finish of the action and return False on timeout"""
+        return self._finished.wait(timeout)
+
+    def result(self, timeout: Optional[float] = None) -> ActionOutcome:
+        """Wait for finish of the action, if it isn't finished in timeout it's timed out and isn't waited anymore"""
+        if not self._finished.wait(timeout):
+            self._complete(ActionOutcome.TIMED_OUT)
+        if self._outcome is None:
+            is_successful = self._is_successful
+            if is_successful is None:
+                success_node = ScKeynodes[ActionStatus.ACTION_FINISHED_SUCCESSFULLY]
+                is_successful = check_connector(sc_type.VAR_PERM_POS_ARC, success_node, self.action_node)
+            self._outcome = ActionOutcome.SUCCESSFUL if is_successful else ActionOutcome.UNSUCCESSFUL
+        return self._outcome
+
+    def add_done_callback(self, callback: Callable[["ActionFuture"], None]) -> None:
+        with self._lock:
+            if not self._finished.is_set():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def _attach(self) -> None:
+        for reaction_node, callback in self._reactions.items():
+            _ActionsCompletion.add(reaction_node, self.action_node, callback)
+
+    def _set_status(self, is_successful: bool) -> None:
+        self._is_successful = is_successful
+
+    def _complete(self, outcome: Optional[ActionOutcome]) -> None:
+        with self._lock:
+            if self._finished.is_set():
+                return
+            self._outcome = outcome
+            self._finished.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for reaction_node, reaction_callback in self._reactions.items():
+            _ActionsCompletion.remove(reaction_node, self.action_node, reaction_callback)
+        for callback in callbacks:
+            callback(self)
+
+
+def _get_status_nodes() -> Tuple[ScAddr, ScAddr, ScAddr]:
+    return (
+        ScKeynodes[ActionStatus.ACTION_FINISHED_SUCCESSFULLY],
+        ScKeynodes[ActionStatus.ACTION_FINISHED_UNSUCCESSFULLY],
+        ScKeynodes[ActionStatus.ACTION_FINISHED],
+    )
+
 
-    def event_callback(_: ScAddr, __: ScAddr, trg: ScAddr) -> ScResult:
-        if trg != reaction_node:
-            return ScResult.SKIP
-        finish_event.set()
-        return ScResult.OK
-
-    event_params = ScEventSubscriptionParams(action_node, ScEventType.AFTER_GENERATE_INCOMING_ARC, event_callback)
-    sc_event = create_elementary_event_subscriptions(event_params)[0]
-    if not check_connector(sc_type.VAR_PERM_POS_ARC, reaction_node, action_node):
-        finish_event.wait(seconds)
-    destroy_elementary_event_subscriptions(sc_event)
-    # TODO: return status in 0.2.0
+def submit_actions(specs: Iterable[ActionSpec], batch_size: int = 100) -> List[ActionFuture]:
+    """Generate and initiate actions with one request for each batch and return futures of their finish"""
+    specs = list(specs)
+    concepts = (concept for spec in specs for concept in (*spec.concepts, spec.initiation))
+    ScKeynodes.prefetch(_get_concepts_types(*concepts))
+    futures = []
+    with _ActionsCompletion.capture(*_get_status_nodes()):
+        for start in range(0, len(specs), batch_size):
+            construction = ScConstruction()
+            aliases = []
+            for index, spec in enumerate(specs[start : start + batch_size]):
+                aliases.append(f"_action_{index}")
+                _add_action_call_to_construction(construction, aliases[-1], *spec)
+            addrs = client.generate_elements(construction)
+            for alias in aliases:
+                futures.append(ActionFuture(addrs[construction.aliases[alias]]))
+                futures[-1]._attach()  # pylint: disable=protected-access
+    return futures
+
+
+def gather(futures: Iterable[ActionFuture], timeout: float = COMMON_WAIT_TIME) -> List[ActionOutcome]:
+    """Wait for finish of actions, each action is timed out if it isn't finished in timeout after its submission"""
+    return [future.result(max(0.0, future.submitted + timeout - time.monotonic())) for future in futures]
+
+
+def as_completed(futures: Iterable[ActionFuture], timeout: float = COMMON_WAIT_TIME) -> Iterator[ActionFuture]:
+    """
+    Yield futures in order of actions finish.
+    Actions which aren't finished in timeout after their submission are timed out and yielded in order of submission.
+    """
+    pending = set(futures)
+    completed: "Queue[ActionFuture]" = Queue()
+    for future in pending:
+        future.add_done_callback(completed.put)
+    while pending:
+        deadline = min(future.submitted for future in pending) + timeout
+        try:
+            future = completed.get(timeout=max(0.0, deadline - time.monotonic()))
+        except Empty:
+            now = time.monotonic()
+            for future in sorted(pending, key=lambda pending_future: pending_future.submitted):
+                if future.submitted + timeout <= now:
+                    future.result(0)  # The future is timed out and put to the queue
+            continue
+        if future in pending:
+            pending.remove(future)
+            yield future
 
 
 def finish_action(action_node: ScAddr, status: Idtf = ActionStatus.ACTION_FINISHED) -> ScAddr:
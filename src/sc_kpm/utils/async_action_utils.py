@@ -0,0 +1,85 @@
+"""
+This source file is part of an OSTIS project. For the latest info, see https://github.com/ostis-ai
+Distributed under the MIT License
+(See an accompanying file LICENSE or a copy at https://opensource.org/licenses/MIT)
+"""
+
+import asyncio
+from typing import Dict, List, Tuple
+
+from sc_client.constants import sc_type
+from sc_client.models import ScAddr
+
+from sc_kpm.identifiers import ActionStatus
+from sc_kpm.sc_keynodes import Idtf, ScKeynodes
+from sc_kpm.utils import action_utils
+from sc_kpm.utils.action_utils import COMMON_WAIT_TIME, IsDynamic, _ActionsCompletion
+from sc_kpm.utils.async_utils import to_thread
+from sc_kpm.utils.common_utils import check_connector
+
+
+async def execute_agent(
+    arguments: Dict[ScAddr, IsDynamic],
+    concepts: List[Idtf],
+    initiation: Idtf = ActionStatus.ACTION_INITIATED,
+    reaction: Idtf = ActionStatus.ACTION_FINISHED_SUCCESSFULLY,
+    wait_time: float = COMMON_WAIT_TIME,
+) -> Tuple[ScAddr, bool]:
+    action = await call_agent(arguments, concepts, initiation)
+    await wait_agent(wait_time, action)
+    result = await to_thread(check_connector, sc_type.VAR_PERM_POS_ARC, ScKeynodes[reaction], action)
+    return action, result
+
+
+async def call_agent(
+    arguments: Dict[ScAddr, IsDynamic],
+    concepts: List[Idtf],
+    initiation: Idtf = ActionStatus.ACTION_INITIATED,
+) -> ScAddr:
+    """Generate the action with arguments and initiate it in one request"""
+    return await to_thread(action_utils.call_agent, arguments, concepts, initiation)
+
+
+async def execute_action(
+    action_node: ScAddr,
+    initiation: Idtf = ActionStatus.ACTION_INITIATED,
+    reaction: Idtf = ActionStatus.ACTION_FINISHED_SUCCESSFULLY,
+    wait_time: float = COMMON_WAIT_TIME,
+) -> bool:
+    await call_action(action_node, initiation)
+    await wait_agent(wait_time, action_node)
+    return await to_thread(check_connector, sc_type.VAR_PERM_POS_ARC, ScKeynodes[reaction], action_node)
+
+
+async def call_action(action_node: ScAddr, initiation: Idtf = ActionStatus.ACTION_INITIATED) -> None:
+    await to_thread(action_utils.call_action, action_node, initiation)
+
+
+async def wait_agent(seconds: float, action_node: ScAddr, reaction_node: ScAddr = None) -> bool:
+    """
+    Wait for generation of the arc from the reaction node and return True if it is generated in time.
+    The wait doesn't occupy a thread, it's woken by the shared subscription of the reaction node.
+    """
+    reaction_node = reaction_node or ScKeynodes[ActionStatus.ACTION_FINISHED]
+    loop = asyncio.get_running_loop()
+    finish_future = loop.create_future()
+
+    def set_finished(future: asyncio.Future) -> None:
+        if not future.done():
+            future.set_result(True)
+
+    def on_finish() -> None:
+        try:
+            loop.call_soon_threadsafe(set_finished, finish_future)
+        except RuntimeError:  # The loop is closed
+            pass
+
+    await to_thread(_ActionsCompletion.add, reaction_node, action_node, on_finish)
+    try:
+        if await to_thread(check_connector, sc_type.VAR_PERM_POS_ARC, reaction_node, action_node):
+            return True
+        return await asyncio.wait_for(finish_future, seconds)
+    except asyncio.TimeoutError:
+        return False
+    finally:
+        _ActionsCompletion.remove(reaction_node, action_node, on_finish)
@@ -0,0 +1,22 @@
+"""
+This source file is part of an OSTIS project. For the latest info, see https://github.com/ostis-ai
+Distributed under the MIT License
+(See an accompanying file LICENSE or a copy at https://opensource.org/licenses/MIT)
+"""
+
+import asyncio
+import contextvars
+import functools
+from typing import Callable, TypeVar
+
+T = TypeVar("T")
+
+
+async def to_thread(function: Callable[..., T], *args, **kwargs) -> T:
+    """
+    Run blocking function (e.g. request to the sc-server) in the default executor of the running loop.
+    Context variables are propagated, so requests are measured as requests of the calling agent.
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(None, functools.partial(context.run, function, *args, **kwargs))
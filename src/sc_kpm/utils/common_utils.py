@@ -5,7 +5,7 @@ Distributed under the MIT License
 """
 
 import warnings
-from typing import List, Optional, Union
+from typing import Dict, List, Optional, Set, Union
 
 from sc_client import client
 from sc_client.constants import sc_type
@@ -199,20 +199,49 @@ def get_edges(source: ScAddr, target: ScAddr, *connector_types: ScType) -> List[
 
 
 def get_element_system_identifier(addr: ScAddr) -> Idtf:
+    return get_elements_system_identifiers(addr)[0]
+
+
+def get_elements_system_identifiers(*addrs: ScAddr) -> List[Idtf]:
+    """
+    Get system identifiers of elements, empty string for elements without them.
+    Identifiers of keynodes and elements in the identifiers cache of ScKeynodes are taken from it,
+    others are searched with one template search and one content request without changes of the KB.
+    """
+    identifiers = {addr: ScKeynodes._get_identifier(addr) for addr in addrs}  # pylint: disable=protected-access
+    unknown_addrs = {addr for addr, identifier in identifiers.items() if identifier is None}
+    if unknown_addrs:
+        links = _search_system_identifier_links(unknown_addrs)
+        if links:
+            contents = client.get_link_content(*links.values())
+            found_identifiers = {addr: content.data for addr, content in zip(links, contents)}
+            ScKeynodes._add_identifiers(found_identifiers)  # pylint: disable=protected-access
+            identifiers.update(found_identifiers)
+    return [identifiers[addr] or "" for addr in addrs]
+
+
+def _search_system_identifier_links(addrs: Set[ScAddr]) -> Dict[ScAddr, ScAddr]:
+    """
+    Search links of system identifiers of elements with one template search.
+    A template can't be bound to many elements without generating elements, so identifiers of all elements
+    are searched and filtered by the given ones
+    """
     nrel_system_idtf = ScKeynodes[CommonIdentifiers.NREL_SYSTEM_IDENTIFIER]
-
+    element = next(iter(addrs)) if len(addrs) == 1 else sc_type.UNKNOWN >> ScAlias.ELEMENT
     templ = ScTemplate()
     templ.quintuple(
-        addr,
+        element,
         sc_type.VAR_COMMON_ARC,
         sc_type.VAR_NODE_LINK >> ScAlias.LINK,
         sc_type.VAR_PERM_POS_ARC,
         nrel_system_idtf,
     )
-    result = client.search_by_template(templ)
-    if result:
-        return get_link_content_data(result[0].get(ScAlias.LINK))
-    return ""
+    links = {}
+    for result in client.search_by_template(templ):
+        addr = result[0]
+        if addr in addrs and addr not in links:
+            links[addr] = result.get(ScAlias.LINK)
+    return links
 
 
 def get_system_idtf(addr: ScAddr) -> Idtf:
@@ -4,11 +4,12 @@ Distributed under the MIT License
 (See an accompanying file LICENSE or a copy at https://opensource.org/licenses/MIT)
 """
 import logging
+import os
 from unittest import TestCase
 
 from sc_kpm import ScServer
 
-SC_SERVER_URL = "ws://localhost:8090/ws_json"
+SC_SERVER_URL = os.environ.get("SC_SERVER_URL", "ws://localhost:8090/ws_json")  # memory:// to test without server
 
 logging.basicConfig(filename="testing.log", filemode="w", level=logging.INFO, force=True)
 
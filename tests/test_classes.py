@@ -3,21 +3,74 @@ This source file is part of an OSTIS project. For the latest info, see https://g
 Distributed under the MIT License
 (See an accompanying file LICENSE or a copy at https://opensource.org/licenses/MIT)
 """
+import asyncio
 import os
+import pstats
 import signal
+import tempfile
 import threading
+import time
+import urllib.request
+from unittest.mock import patch
 
+from sc_client import client
+from sc_client.constants import sc_type
 from sc_client.constants.common import ScEventType
 from sc_client.models import ScAddr
 
-from sc_kpm import ScAgent, ScAgentClassic, ScModule, ScResult
-from sc_kpm.identifiers import CommonIdentifiers
-from sc_kpm.utils.action_utils import execute_agent, finish_action_with_status
-from tests.common_tests import BaseTestCase
+from sc_kpm import (
+    AsyncScAgentClassic,
+    OverflowPolicy,
+    ScAgent,
+    ScAgentClassic,
+    ScAgentExecutor,
+    ScKeynode,
+    ScKeynodes,
+    ScKeynodesContainer,
+    ScModule,
+    ScProcessExecutor,
+    ScResult,
+    ScServer,
+)
+from sc_kpm.identifiers import ActionStatus, CommonIdentifiers
+from sc_kpm.sc_agent import ScAgentAbstract, _InFlightEvents
+from sc_kpm.sc_agent_metrics import EventTimer
+from sc_kpm.sc_agent_profiler import ScAgentProfiler
+from sc_kpm.sc_keynodes import Idtf
+from sc_kpm.sc_module import ScModuleAbstract, register_modules, unregister_modules
+from sc_kpm.sc_server import ReconnectPolicy
+from sc_kpm.sc_tracer import RoundTripsBudgetError, ScTracer, _RequestHooks, max_round_trips
+from sc_kpm.utils import check_connector, generate_connector, generate_node
+from sc_kpm.utils.action_utils import (
+    call_action,
+    call_agent,
+    execute_agent,
+    finish_action_with_status,
+    generate_action,
+    wait_agent,
+)
+from sc_kpm.utils.async_utils import to_thread
+from tests.common_tests import SC_SERVER_URL, BaseTestCase
 
 WAIT_TIME = 1
 
 
+class CpuBoundAgent(ScAgentClassic):
+    is_cpu_bound = True
+
+    def on_event(self, event_element: ScAddr, event_connector: ScAddr, action_element: ScAddr) -> ScResult:
+        if sum(i * i for i in range(10**5)) != 333328333350000:
+            return ScResult.ERROR
+        return ScResult.OK
+
+
+class FinishingCpuBoundAgent(CpuBoundAgent):
+    def on_event(self, event_element: ScAddr, event_connector: ScAddr, action_element: ScAddr) -> ScResult:
+        result = super().on_event(event_element, event_connector, action_element)
+        finish_action_with_status(action_element, result == ScResult.OK)
+        return result
+
+
 class CommonTests(BaseTestCase):
     def test_sc_agents(self):
         class Agent(ScAgent):
@@ -62,6 +115,517 @@ class CommonTests(BaseTestCase):
         self.assertFalse(execute_agent(**kwargs_classic)[1])
         self.server.remove_modules(module)
 
+    def test_sc_agents_classic_router(self):
+        class AgentClassic(ScAgentClassic):
+            def on_event(self, event_element: ScAddr, event_connector: ScAddr, action_element: ScAddr) -> ScResult:
+                finish_action_with_status(action_element, True)
+                return ScResult.OK
+
+        def is_executing_successful(action_class_name: str) -> bool:
+            return execute_agent(
+                arguments={},
+                concepts=[CommonIdentifiers.ACTION, action_class_name],
+                wait_time=WAIT_TIME,
+            )[1]
+
+        agents = [AgentClassic(f"test_routed_agent_{i}") for i in range(3)]
+        module = ScModule(*agents)
+        self.server.add_modules(module)
+        with self.server.register_modules():
+            self.assertTrue(all(agent._event is agents[0]._event for agent in agents))
+            self.assertTrue(is_executing_successful("test_routed_agent_0"))
+            self.assertTrue(is_executing_successful("test_routed_agent_2"))
+            self.assertFalse(is_executing_successful("test_routed_agent_unknown"))
+            module.remove_agent(agents[2])
+            self.assertFalse(is_executing_successful("test_routed_agent_2"))
+            self.assertTrue(is_executing_successful("test_routed_agent_1"))
+        self.assertFalse(is_executing_successful("test_routed_agent_0"))
+        self.server.remove_modules(module)
+
+    def test_sc_agents_classic_router_hands_off_agents_of_same_class(self):
+        released = threading.Event()
+        started = threading.Semaphore(0)
+        threads_names = []
+
+        class AgentClassic(ScAgentClassic):
+            def on_event(self, event_element: ScAddr, event_connector: ScAddr, action_element: ScAddr) -> ScResult:
+                threads_names.append(threading.current_thread().name)
+                started.release()
+                released.wait(WAIT_TIME)
+                return ScResult.OK
+
+        module = ScModule(*(AgentClassic("test_routed_same_class_agent") for _ in range(3)))
+        self.server.add_modules(module)
+        with self.server.register_modules():
+            action_node = call_agent({}, [CommonIdentifiers.ACTION, "test_routed_same_class_agent"])
+            self.assertTrue(all(started.acquire(timeout=WAIT_TIME) for _ in range(3)))
+            with _InFlightEvents.condition:
+                handled_actions = [action for _, action in _InFlightEvents._events.values()]
+            released.set()
+        self.server.remove_modules(module)
+        self.assertEqual(handled_actions.count(action_node), 3)
+        self.assertEqual(len([name for name in threads_names if name.startswith("sc-agent-worker")]), 2)
+
+    def test_sc_agents_executor(self):
+        class AgentClassic(ScAgentClassic):
+            def on_event(self, event_element: ScAddr, event_connector: ScAddr, action_element: ScAddr) -> ScResult:
+                finish_action_with_status(action_element, True)
+                return ScResult.OK
+
+        executor = ScAgentExecutor(max_workers=2)
+        agent = AgentClassic("test_executed_agent")
+        module = ScModule(agent, executor=executor)
+        self.assertIs(agent.executor, executor)
+        self.server.add_modules(module)
+        with self.server.register_modules():
+            self.assertTrue(
+                execute_agent(
+                    arguments={},
+                    concepts=[CommonIdentifiers.ACTION, "test_executed_agent"],
+                    wait_time=WAIT_TIME,
+                )[1]
+            )
+        self.server.remove_modules(module)
+        executor.shutdown()
+        info = executor.info()
+        self.assertEqual((info.submitted, info.completed, info.queue_depth, info.workers), (1, 1, 0, 0))
+
+    def test_sc_agents_executor_overflow(self):
+        started = threading.Event()
+        released = threading.Event()
+
+        def handler(*_) -> ScResult:
+            started.set()
+            released.wait(WAIT_TIME)
+            return ScResult.OK
+
+        for policy, result in ((OverflowPolicy.DROP, ScResult.SKIP), (OverflowPolicy.REJECT, ScResult.NO)):
+            started.clear()
+            released.clear()
+            executor = ScAgentExecutor(max_workers=1, max_queue_size=1, overflow_policy=policy, reject_result=result)
+            event = (ScAddr(0), ScAddr(0), ScAddr(0))
+            self.assertEqual(executor.submit(handler, *event), ScResult.UNKNOWN)
+            self.assertTrue(started.wait(WAIT_TIME))
+            self.assertEqual(executor.submit(handler, *event), ScResult.UNKNOWN)
+            self.assertEqual(executor.submit(handler, *event), result)
+            self.assertEqual(executor.info().queue_depth, 1)
+            released.set()
+            executor.shutdown()
+            info = executor.info()
+            self.assertEqual((info.completed, info.dropped + info.rejected), (2, 1))
+
+    def test_sc_agents_process_executor(self):
+        process_executor = ScProcessExecutor(SC_SERVER_URL, max_workers=2)
+        agent = CpuBoundAgent("test_cpu_bound_agent")
+        module = ScModule(agent, executor=ScAgentExecutor(), process_executor=process_executor)
+        self.assertIs(agent.executor, process_executor)
+        event = (ScAddr(0), ScAddr(0), ScAddr(0))
+        for _ in range(3):
+            self.assertEqual(process_executor.submit(agent.on_event, *event), ScResult.UNKNOWN)
+        process_executor.shutdown()
+        info = process_executor.info()
+        self.assertEqual((info.completed, info.failed), (3, 0))
+        module.remove_agent(agent)
+
+    def test_sc_module_process_executor(self):
+        process_executor = ScProcessExecutor(SC_SERVER_URL, max_workers=1)
+        agent = FinishingCpuBoundAgent("test_cpu_bound_module_agent")
+        module = ScModule(agent, process_executor=process_executor)
+        self.server.add_modules(module)
+        with self.server.register_modules():
+            for _ in range(2):
+                self.assertTrue(
+                    execute_agent(
+                        arguments={},
+                        concepts=[CommonIdentifiers.ACTION, "test_cpu_bound_module_agent"],
+                        wait_time=WAIT_TIME * 10,  # The worker process is spawned on the first event
+                    )[1]
+                )
+        self.server.remove_modules(module)
+        process_executor.shutdown()
+        info = process_executor.info()
+        self.assertEqual((info.submitted, info.completed, info.failed), (2, 2, 0))
+        self.assertEqual(agent.metrics.info().results.get(ScResult.OK), 2)
+
+    def test_async_sc_agents(self):
+        class AsyncAgentClassic(AsyncScAgentClassic):
+            async def on_event(
+                self, event_element: ScAddr, event_connector: ScAddr, action_element: ScAddr
+            ) -> ScResult:
+                await asyncio.sleep(0.01)
+                await to_thread(finish_action_with_status, action_element, True)
+                return ScResult.OK
+
+        def is_executing_successful() -> bool:
+            return execute_agent(
+                arguments={},
+                concepts=[CommonIdentifiers.ACTION, "test_async_agent"],
+                wait_time=WAIT_TIME,
+            )[1]
+
+        async def serve_and_execute() -> list:
+            serving = asyncio.ensure_future(self.server.serve_async(max_concurrent_events=2))
+            results = await asyncio.gather(*(to_thread(is_executing_successful) for _ in range(4)))
+            serving.cancel()
+            await asyncio.gather(serving, return_exceptions=True)
+            return results
+
+        module = ScModule(AsyncAgentClassic("test_async_agent"))
+        self.server.add_modules(module)
+        with self.server.register_modules():
+            self.assertTrue(is_executing_successful())  # Without the event loop
+            self.assertEqual(asyncio.run(serve_and_execute()), [True] * 4)
+        self.server.remove_modules(module)
+
+    def test_batched_registration(self):
+        class TestAgent(ScAgent):
+            def on_event(self, event_element: ScAddr, event_connector: ScAddr, action_element: ScAddr) -> ScResult:
+                return ScResult.OK
+
+        class TestAgentClassic(ScAgentClassic):
+            def on_event(self, event_element: ScAddr, event_connector: ScAddr, action_element: ScAddr) -> ScResult:
+                return ScResult.OK
+
+        modules = [
+            ScModule(
+                *(TestAgent(f"test_batched_agent_{i}", ScEventType.AFTER_GENERATE_OUTGOING_ARC) for i in range(5))
+            ),
+            ScModule(*(TestAgentClassic(f"test_batched_classic_agent_{i}") for i in range(5))),
+        ]
+        self.server.add_modules(*modules)
+        create = patch.object(
+            client, "create_elementary_event_subscriptions", wraps=client.create_elementary_event_subscriptions
+        )
+        destroy = patch.object(
+            client, "destroy_elementary_event_subscriptions", wraps=client.destroy_elementary_event_subscriptions
+        )
+        with create as create_mock, destroy as destroy_mock:
+            self.server.register_modules()
+            self.server.unregister_modules()
+        self.assertEqual(create_mock.call_count, 1)
+        self.assertEqual(len(create_mock.call_args.args), 6)
+        self.assertEqual(destroy_mock.call_count, 1)
+        self.assertEqual(len(destroy_mock.call_args.args), 6)
+        self.server.remove_modules(*modules)
+
+    def test_sc_server_reconnect(self):
+        class AgentClassic(ScAgentClassic):
+            def on_event(self, event_element: ScAddr, event_connector: ScAddr, action_element: ScAddr) -> ScResult:
+                finish_action_with_status(action_element, True)
+                return ScResult.OK
+
+        def is_executing_successful() -> bool:
+            return execute_agent(
+                arguments={},
+                concepts=[CommonIdentifiers.ACTION, "test_reconnected_agent"],
+                wait_time=WAIT_TIME,
+            )[1]
+
+        module = ScModule(AgentClassic("test_reconnected_agent"))
+        self.server.disconnect()
+        server = ScServer(SC_SERVER_URL, reconnect_policy=ReconnectPolicy(initial_delay=0.01, check_interval=0.01))
+        server.add_modules(module)
+        with server.start():
+            self.assertTrue(is_executing_successful())
+            client.disconnect()  # Connection is lost without unregistration
+            generate_node(sc_type.CONST_NODE)  # The failed request reconnects, state is restored by the supervisor
+            self.assertTrue(server.wait_connection(WAIT_TIME))
+            self.assertFalse(server.is_connection_lost)
+            self.assertTrue(is_executing_successful())
+        server.remove_modules(module)
+        self.server.connect()
+
+    def test_sc_server_reconnect_with_outdated_keynodes(self):
+        class AgentClassic(ScAgentClassic):
+            def on_event(self, event_element: ScAddr, event_connector: ScAddr, action_element: ScAddr) -> ScResult:
+                finish_action_with_status(action_element, True)
+                return ScResult.OK
+
+        module = ScModule(AgentClassic("test_reresolved_agent"))
+        self.server.disconnect()
+        server = ScServer(SC_SERVER_URL, reconnect_policy=ReconnectPolicy(initial_delay=0.01, check_interval=60))
+        server.add_modules(module)
+        with server.start():
+            self.assertTrue(client.erase_elements(ScKeynodes["test_reresolved_agent"]))  # Cached keynode is outdated
+            client.disconnect()
+            generate_node(sc_type.CONST_NODE)
+            self.assertTrue(server.wait_connection(WAIT_TIME))
+            self.assertTrue(
+                execute_agent({}, [CommonIdentifiers.ACTION, "test_reresolved_agent"], wait_time=WAIT_TIME)[1]
+            )
+        server.remove_modules(module)
+        self.server.connect()
+
+    def test_unregister_custom_module_after_connection_loss(self):
+        class CustomModule(ScModuleAbstract):
+            def __init__(self, agent: ScAgentAbstract) -> None:
+                self.agent = agent
+
+            def __repr__(self) -> str:
+                return "CustomModule"
+
+            def add_agent(self, agent: ScAgentAbstract) -> None:
+                pass
+
+            def remove_agent(self, agent: ScAgentAbstract) -> None:
+                pass
+
+            def _register(self) -> None:
+                self.agent._register()
+
+            def _unregister(self) -> None:
+                self.agent._unregister()
+
+        class TestAgent(ScAgent):
+            def on_event(self, event_element: ScAddr, event_connector: ScAddr, action_element: ScAddr) -> ScResult:
+                return ScResult.OK
+
+        module = CustomModule(TestAgent("test_custom_module_agent", ScEventType.AFTER_GENERATE_OUTGOING_ARC))
+        register_modules(module)
+        destroy = patch.object(
+            client, "destroy_elementary_event_subscriptions", wraps=client.destroy_elementary_event_subscriptions
+        )
+        with destroy as destroy_mock:
+            unregister_modules(module, is_connection_lost=True)
+        self.assertEqual(destroy_mock.call_count, 0)
+        self.assertIsNone(module.agent._event)
+
+    def test_sc_server_reconnect_during_wait(self):
+        server = ScServer(SC_SERVER_URL, reconnect_policy=ReconnectPolicy(initial_delay=0.01, check_interval=60))
+        self.server.disconnect()
+        with server.connect():
+            action_node = generate_action()
+            reaction_node = generate_node(sc_type.CONST_NODE)  # Its subscription is created by the wait
+            client.disconnect()  # Connection is lost before the subscription request of the wait
+            waiting = threading.Thread(target=wait_agent, args=(WAIT_TIME, action_node, reaction_node), daemon=True)
+            waiting.start()
+            self.assertTrue(server.wait_connection(WAIT_TIME))
+            generate_connector(sc_type.CONST_PERM_POS_ARC, reaction_node, action_node)
+            waiting.join(WAIT_TIME)
+            self.assertFalse(waiting.is_alive())
+        self.server.connect()
+
+    def test_sc_server_reconnect_during_keynodes_resolving(self):
+        server = ScServer(SC_SERVER_URL, reconnect_policy=ReconnectPolicy(initial_delay=0.01, check_interval=60))
+        self.server.disconnect()
+        with server.connect():
+
+            class TestKeynodes(ScKeynodesContainer):  # It's declared after connect, so it's resolved on access
+                test_reconnected_keynode = ScKeynode(sc_type=sc_type.CONST_NODE)
+
+            client.disconnect()  # Connection is lost before the first access to the keynodes
+            resolving = threading.Thread(target=getattr, args=(TestKeynodes, "test_reconnected_keynode"), daemon=True)
+            resolving.start()
+            resolving.join(WAIT_TIME)
+            self.assertFalse(resolving.is_alive())
+            self.assertTrue(server.wait_connection(WAIT_TIME))
+            self.assertTrue(TestKeynodes.test_reconnected_keynode.is_valid())
+        self.server.connect()
+
+    def test_sc_server_serve_stops_on_signal(self):
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            start = time.monotonic()
+            threading.Timer(0.1, signal.raise_signal, (signal_number,)).start()
+            self.server.serve()
+            self.assertLess(time.monotonic() - start, WAIT_TIME)
+
+    def test_sc_server_drain(self):
+        started = threading.Event()
+        released = threading.Event()
+
+        class AgentClassic(ScAgentClassic):
+            def on_event(self, event_element: ScAddr, event_connector: ScAddr, action_element: ScAddr) -> ScResult:
+                started.set()
+                if released.wait(WAIT_TIME):
+                    finish_action_with_status(action_element, True)
+                return ScResult.OK
+
+        def start_action() -> ScAddr:
+            action_node = generate_action(CommonIdentifiers.ACTION, "test_drained_agent")
+            call_action(action_node)
+            self.assertTrue(started.wait(WAIT_TIME))
+            started.clear()
+            return action_node
+
+        def is_finished(action_node: ScAddr, status: Idtf) -> bool:
+            return check_connector(sc_type.VAR_PERM_POS_ARC, ScKeynodes[status], action_node)
+
+        module = ScModule(AgentClassic("test_drained_agent"))
+        self.server.disconnect()
+        server = ScServer(SC_SERVER_URL, drain_on_stop=True, drain_timeout=WAIT_TIME / 2, finish_timed_out_actions=True)
+        server.add_modules(module)
+        with server.start():
+            handled_action = start_action()
+            threading.Timer(0.05, released.set).start()
+        released.clear()
+        with server.start():
+            threading.Timer(0.1, signal.raise_signal, (signal.SIGTERM,)).start()
+            server.serve()
+            timed_out_action = start_action()
+        server.remove_modules(module)
+        self.server.connect()
+        self.assertTrue(is_finished(handled_action, ActionStatus.ACTION_FINISHED_SUCCESSFULLY))
+        self.assertTrue(is_finished(timed_out_action, ActionStatus.ACTION_FINISHED_UNSUCCESSFULLY))
+        self.assertTrue(is_finished(timed_out_action, ActionStatus.ACTION_FINISHED))
+
+    def test_sc_server_drain_of_own_modules(self):
+        class AgentClassic(ScAgentClassic):
+            def on_event(self, event_element: ScAddr, event_connector: ScAddr, action_element: ScAddr) -> ScResult:
+                finish_action_with_status(action_element, True)
+                return ScResult.OK
+
+        def is_executing_successful(wait_time: float = WAIT_TIME) -> bool:
+            return execute_agent({}, [CommonIdentifiers.ACTION, "test_drained_module_agent"], wait_time=wait_time)[1]
+
+        module = ScModule(AgentClassic("test_drained_module_agent"))
+        other_server = ScServer(SC_SERVER_URL)
+        other_server.add_modules(ScModule(AgentClassic("test_drained_module_agent")))
+        self.server.add_modules(module)
+        with self.server.register_modules():
+            other_server.drain()
+            self.assertTrue(is_executing_successful())
+            self.server.drain()
+            self.assertFalse(is_executing_successful(wait_time=0.1))
+        with self.server.register_modules():
+            self.assertTrue(is_executing_successful())
+        self.server.remove_modules(module)
+
+    def test_sc_agents_metrics(self):
+        class AgentClassic(ScAgentClassic):
+            def on_event(self, event_element: ScAddr, event_connector: ScAddr, action_element: ScAddr) -> ScResult:
+                finish_action_with_status(action_element, True)
+                return ScResult.OK
+
+        def is_executing_successful() -> bool:
+            return execute_agent(
+                arguments={},
+                concepts=[CommonIdentifiers.ACTION, "test_measured_agent"],
+                wait_time=WAIT_TIME,
+            )[1]
+
+        agent = AgentClassic("test_measured_agent")
+        module = ScModule(agent)
+        self.server.add_modules(module)
+        with self.server.register_modules():
+            for _ in range(3):
+                self.assertTrue(is_executing_successful())
+        time.sleep(0.05)  # Results are recorded after finishing of actions
+        info = agent.metrics.info()
+        self.assertEqual((info.events, info.results, info.failed), (3, {ScResult.OK: 3}, 0))
+        self.assertGreater(info.kb_time, 0)
+        self.assertAlmostEqual(info.total_time, info.kb_time + info.python_time)
+        self.assertEqual(info.latency_buckets[-1], 3)
+        self.assertGreater(info.latency_percentiles[99], 0)
+        self.assertEqual(module.metrics_info().events, 3)
+        self.assertEqual(self.server.metrics_info().results, {ScResult.OK: 3})
+        with self.server.start_metrics_endpoint(port=0):
+            with urllib.request.urlopen(self.server.metrics_url) as response:
+                text = response.read().decode()
+        self.assertIsNone(self.server.metrics_url)
+        self.assertIn(f'sc_kpm_agent_results_total{{agent="{agent!r}",result="OK"}} 3', text)
+        self.assertIn(f'sc_kpm_agent_latency_seconds_count{{agent="{agent!r}"}} 3', text)
+        self.server.remove_modules(module)
+
+    def test_event_timer_without_hooks_registration(self):
+        with patch.object(_RequestHooks, "add") as add:
+            with EventTimer() as timer:
+                generate_node(sc_type.CONST_NODE)
+        self.assertEqual(add.call_count, 0)
+        self.assertGreater(timer.kb_time, 0)
+        self.assertGreaterEqual(timer.duration, timer.kb_time)
+
+    def test_sc_agents_metrics_skip(self):
+        class AgentClassic(ScAgentClassic):
+            def on_event(self, event_element: ScAddr, event_connector: ScAddr, action_element: ScAddr) -> ScResult:
+                finish_action_with_status(action_element, True)
+                return ScResult.OK
+
+        agent = AgentClassic("test_skipping_agent")
+        module = ScModule(agent)
+        self.server.add_modules(module)
+        with self.server.register_modules():
+            call_agent({}, [CommonIdentifiers.ACTION, "test_not_skipping_agent"])
+            deadline = time.monotonic() + WAIT_TIME
+            while not agent.metrics.info().events and time.monotonic() < deadline:
+                time.sleep(0.01)
+        info = agent.metrics.info()
+        self.assertEqual((info.events, info.results), (1, {ScResult.SKIP: 1}))
+        self.server.remove_modules(module)
+
+    def test_sc_agents_profiler(self):
+        class SlowAgent(ScAgentClassic):
+            def on_event(self, event_element: ScAddr, event_connector: ScAddr, action_element: ScAddr) -> ScResult:
+                time.sleep(0.05)
+                finish_action_with_status(action_element, True)
+                return ScResult.OK
+
+        def is_executing_successful() -> bool:
+            return execute_agent(
+                arguments={},
+                concepts=[CommonIdentifiers.ACTION, "test_profiled_agent"],
+                wait_time=WAIT_TIME,
+            )[1]
+
+        with tempfile.TemporaryDirectory() as directory:
+            profiler = ScAgentProfiler(directory, every_nth=2, slower_than=0.01, sampling_interval=0.001)
+            module = ScModule(SlowAgent("test_profiled_agent"), profiler=profiler)
+            self.server.add_modules(module)
+            with self.server.register_modules():
+                for _ in range(2):
+                    self.assertTrue(is_executing_successful())
+            self.server.remove_modules(module)
+            time.sleep(0.05)  # Activations are finished after finishing of actions
+            profiler.close()
+            agent_class = f"{__name__}.SlowAgent"
+            self.assertEqual(profiler.info(), {agent_class: (2, 1)})
+            stats = pstats.Stats(os.path.join(directory, f"{agent_class}.prof"))
+            self.assertTrue(any(function[2] == "on_event" for function in stats.stats))
+            with open(os.path.join(directory, f"{agent_class}.folded"), encoding="utf-8") as file:
+                self.assertIn("on_event", file.read())
+
+    def test_sc_agents_profiler_overlapping_activations(self):
+        started = threading.Barrier(2)
+
+        def handler(index: int) -> int:
+            started.wait(WAIT_TIME)
+            return index
+
+        with tempfile.TemporaryDirectory() as directory:
+            profiler = ScAgentProfiler(directory, every_nth=1)
+            results = []
+            threads = [
+                threading.Thread(target=lambda index=index: results.append(profiler.profile("agent", handler, index)))
+                for index in range(2)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            profiler.close()
+            self.assertEqual(sorted(results), [0, 1])
+            self.assertEqual(profiler.info(), {"agent": (2, 0)})
+
+    def test_sc_tracer(self):
+        with max_round_trips(1) as tracer:
+            generate_node(sc_type.CONST_NODE)
+        self.assertEqual(tracer.round_trips, 1)
+        request = tracer.requests[0]
+        self.assertEqual(request.kind, "GENERATE_ELEMENTS")
+        self.assertGreater(request.payload_size, 0)
+        self.assertIn("common_utils.py", request.site)
+        self.assertIn("test_classes.py", request.origin)
+        self.assertEqual(tracer.summary()["GENERATE_ELEMENTS"][0], 1)
+        with self.assertRaises(RoundTripsBudgetError):
+            with max_round_trips(1):
+                generate_node(sc_type.CONST_NODE)
+                generate_node(sc_type.CONST_NODE)
+        for all_threads, round_trips in ((False, 0), (True, 1)):
+            with ScTracer(all_threads=all_threads) as tracer:
+                thread = threading.Thread(target=generate_node, args=(sc_type.CONST_NODE,))
+                thread.start()
+                thread.join()
+            self.assertEqual(tracer.round_trips, round_trips)
+
     def test_sc_module(self):
         class TestAgent(ScAgent):
             def on_event(self, event_element: ScAddr, event_connector: ScAddr, action_element: ScAddr) -> ScResult:
@@ -124,16 +688,18 @@ class CommonTests(BaseTestCase):
         self.server.unregister_modules()
         self.assertFalse(is_executing_successful())
 
-        main_pid = os.getpid()
+        results = []
 
         def execute_and_send_sigint():
-            self.assertTrue(is_executing_successful())
-            os.kill(main_pid, signal.SIGINT)
-            self.assertRaises(ConnectionAbortedError, is_executing_successful())
+            results.append(is_executing_successful())
+            signal.raise_signal(signal.SIGINT)
 
         with self.server.register_modules():
             thread = threading.Thread(target=execute_and_send_sigint, daemon=True)
             thread.start()
             self.server.serve()
-
+            thread.join()
+        self.assertEqual(results, [True])
         self.server.remove_modules(module)
+        client.disconnect()
+        self.assertRaises(ConnectionAbortedError, is_executing_successful)
@@ -1,11 +1,17 @@
-from common_tests import BaseTestCase
+import os
+import tempfile
+import threading
+import time
+from unittest.mock import patch
+
+from common_tests import SC_SERVER_URL, BaseTestCase
 from sc_client import client
 from sc_client.client import erase_elements, get_elements_types
 from sc_client.constants import sc_type
-from sc_client.constants.exceptions import InvalidValueError
+from sc_client.constants.exceptions import InvalidValueError, ServerError
 from sc_client.models import ScAddr, ScIdtfResolveParams
 
-from sc_kpm import ScKeynodes
+from sc_kpm import ScKeynode, ScKeynodes, ScKeynodesContainer
 
 
 class KeynodesTests(BaseTestCase):
@@ -27,6 +33,133 @@ class KeynodesTests(BaseTestCase):
         self.assertTrue(erase_elements(addr))
         self.assertTrue(addr.is_valid())
 
+    def test_prefetch_keynodes(self):
+        idtf_new = "idtf_prefetched_keynode"
+        idtf_unknown = "idtf_prefetched_unknown_keynode"
+        keynodes = ScKeynodes.prefetch({idtf_new: sc_type.CONST_NODE, idtf_unknown: None})
+        self.assertTrue(keynodes[idtf_new].is_valid())
+        self.assertFalse(keynodes[idtf_unknown].is_valid())
+        self.assertEqual(ScKeynodes[idtf_new], keynodes[idtf_new])
+        self.assertTrue(ScKeynodes.erase(idtf_new))
+
+    def test_save_and_load_keynodes(self):
+        idtf = "idtf_saved_keynode"
+        addr = ScKeynodes.resolve(idtf, sc_type.CONST_NODE)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "keynodes.sqlite3")
+            ScKeynodes.save(path, SC_SERVER_URL)
+            del ScKeynodes._dict[idtf]
+            self.assertGreater(ScKeynodes.load(path, SC_SERVER_URL), 0)
+            self.assertEqual(ScKeynodes._dict[idtf], addr)
+            self.assertEqual(ScKeynodes.load(path, "ws://other_server"), 0)
+        self.assertTrue(ScKeynodes.erase(idtf))
+
+    def test_save_keynodes_retries_once(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "keynodes.sqlite3")
+            with patch.object(
+                client, "get_elements_types", side_effect=ServerError("error")
+            ) as get_types, patch.object(ScKeynodes, "_remove_outdated"):
+                with self.assertRaises(ServerError):
+                    ScKeynodes.save(path, SC_SERVER_URL)
+            self.assertEqual(get_types.call_count, 2)
+
+    def test_track_keynodes_erasure(self):
+        idtf = "idtf_tracked_keynode"
+        ScKeynodes.track_erasure()
+        try:
+            addr = ScKeynodes.resolve(idtf, sc_type.CONST_NODE)
+            self.assertTrue(erase_elements(addr))
+            for _ in range(100):
+                if idtf not in ScKeynodes._dict:
+                    break
+                time.sleep(0.01)
+            self.assertNotIn(idtf, ScKeynodes._dict)
+            self.assertFalse(ScKeynodes.get(idtf).is_valid())
+        finally:
+            ScKeynodes.track_erasure(False)
+
+    def test_remove_outdated_tracked_keynode(self):
+        idtf = "idtf_outdated_tracked_keynode"
+        ScKeynodes.track_erasure()
+        try:
+            addr = ScKeynodes.resolve(idtf, sc_type.CONST_NODE)
+            subscription = ScKeynodes._erasure_subscriptions[addr]
+
+            def resolve_keynodes(*params: ScIdtfResolveParams):
+                return [ScAddr(0) if param["idtf"] == idtf else ScKeynodes._dict[param["idtf"]] for param in params]
+
+            with patch.object(client, "resolve_keynodes", side_effect=resolve_keynodes), patch.object(
+                client, "destroy_elementary_event_subscriptions", wraps=client.destroy_elementary_event_subscriptions
+            ) as destroy:
+                ScKeynodes._remove_outdated()
+            self.assertNotIn(idtf, ScKeynodes._dict)
+            self.assertEqual(destroy.call_args.args, (subscription,))
+            self.assertNotIn(addr, ScKeynodes._erasure_subscriptions)
+        finally:
+            ScKeynodes.track_erasure(False)
+        self.assertTrue(erase_elements(addr))
+
+    def test_negative_cache(self):
+        idtf = "idtf_negative_cached_keynode"
+        ScKeynodes.configure_negative_cache(max_size=10, ttl=60)
+        try:
+            self.assertFalse(ScKeynodes.get(idtf).is_valid())
+            negative_hits = ScKeynodes.cache_info().negative_hits
+            self.assertFalse(ScKeynodes.get(idtf).is_valid())
+            self.assertEqual(ScKeynodes.cache_info().negative_hits, negative_hits + 1)
+
+            client.resolve_keynodes(ScIdtfResolveParams(idtf=idtf, type=sc_type.CONST_NODE))
+            self.assertFalse(ScKeynodes.get(idtf).is_valid())
+            ScKeynodes.invalidate_negative_cache(idtf)
+            self.assertTrue(ScKeynodes.get(idtf).is_valid())
+            self.assertTrue(ScKeynodes.erase(idtf))
+        finally:
+            ScKeynodes.configure_negative_cache(max_size=0, ttl=0)
+
+    def test_concurrent_resolve_keynode(self):
+        idtf = "idtf_concurrent_keynode"
+        threads_count = 10
+        barrier = threading.Barrier(threads_count)
+        results = []
+
+        def resolve() -> None:
+            barrier.wait()
+            results.append(ScKeynodes.resolve(idtf, sc_type.CONST_NODE))
+
+        misses = ScKeynodes.cache_info().misses
+        threads = [threading.Thread(target=resolve) for _ in range(threads_count)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(ScKeynodes.cache_info().misses, misses + 1)
+        self.assertEqual(len(results), threads_count)
+        self.assertTrue(results[0].is_valid())
+        self.assertTrue(all(result == results[0] for result in results))
+        self.assertTrue(ScKeynodes.erase(idtf))
+
+    def test_keynodes_container(self):
+        class TestKeynodes(ScKeynodesContainer):
+            idtf_container_keynode: ScAddr = ScKeynode(sc_type=sc_type.CONST_NODE_CLASS)
+            other_keynode: ScAddr = ScKeynode("idtf_container_other_keynode", sc_type.CONST_NODE_ROLE)
+            unknown_keynode: ScAddr = ScKeynode("idtf_container_unknown_keynode")
+
+        class DerivedKeynodes(TestKeynodes):
+            derived_keynode: ScAddr = ScKeynode("idtf_container_derived_keynode", sc_type.CONST_NODE)
+
+        misses = ScKeynodes.cache_info().misses
+        derived_keynode = DerivedKeynodes.derived_keynode
+        self.assertEqual(ScKeynodes.cache_info().misses, misses + 4)
+        self.assertIsInstance(vars(DerivedKeynodes)["derived_keynode"], ScAddr)
+        self.assertIsInstance(vars(TestKeynodes)["other_keynode"], ScAddr)
+        self.assertEqual(derived_keynode, ScKeynodes["idtf_container_derived_keynode"])
+        self.assertEqual(TestKeynodes.idtf_container_keynode, ScKeynodes["idtf_container_keynode"])
+        self.assertTrue(get_elements_types(DerivedKeynodes.other_keynode)[0].is_role())
+        self.assertFalse(TestKeynodes.unknown_keynode.is_valid())
+        for idtf in ("idtf_container_keynode", "idtf_container_other_keynode", "idtf_container_derived_keynode"):
+            self.assertTrue(ScKeynodes.erase(idtf))
+
     def test_erase_keynode(self):
         idtf = "idtf_to_erase_keynode"
         ScKeynodes.resolve(idtf, sc_type.CONST_NODE)
@@ -42,8 +175,19 @@ class KeynodesTests(BaseTestCase):
         self.assertTrue(rrel_1.is_valid())
         self.assertTrue(get_elements_types(rrel_1)[0].is_role())
 
-    def test_max_rrel(self):
-        self.assertRaises(KeyError, ScKeynodes.rrel_index, ScKeynodes._max_rrel_index + 1)
+    def test_big_rrel(self):
+        rrel_100 = ScKeynodes.rrel_index(100)
+        self.assertTrue(rrel_100.is_valid())
+        self.assertTrue(get_elements_types(rrel_100)[0].is_role())
+        self.assertEqual(rrel_100, ScKeynodes["rrel_100"])
+
+    def test_rrel_block(self):
+        rrels = ScKeynodes.rrel_indices(130, 140)
+        misses = ScKeynodes.cache_info().misses
+        self.assertEqual(ScKeynodes.rrel_index(129), ScKeynodes["rrel_129"])
+        self.assertEqual(ScKeynodes.rrel_indices(135, 137), rrels[5:7])
+        self.assertEqual(ScKeynodes.cache_info().misses, misses)
+        self.assertEqual(ScKeynodes.rrel_indices(140, 140), [])
 
     def test_min_rrel(self):
         self.assertRaises(KeyError, ScKeynodes.rrel_index, ScKeynodes._min_rrel_index - 1)
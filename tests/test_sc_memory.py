@@ -0,0 +1,93 @@
+"""
+This source file is part of an OSTIS project. For the latest info, see https://github.com/ostis-ai
+Distributed under the MIT License
+(See an accompanying file LICENSE or a copy at https://opensource.org/licenses/MIT)
+"""
+import threading
+import time
+from unittest import TestCase
+
+from sc_client import client, session
+from sc_client.constants import sc_type
+from sc_client.constants.common import ScEventType
+from sc_client.constants.exceptions import ServerError
+from sc_client.models import ScEventSubscriptionParams, ScIdtfResolveParams, ScTemplate
+
+from sc_kpm import ScServer
+from sc_kpm.sc_memory import ScMemoryStandIn
+from sc_kpm.sc_result import ScResult
+from sc_kpm.utils import generate_connector, generate_node
+
+LATENCY = 0.01
+
+
+class ScMemoryStandInTestCase(TestCase):
+    def setUp(self) -> None:
+        self.stand_in = ScMemoryStandIn(latency=LATENCY)
+        self.stand_in.install()
+        client.connect("memory://")
+
+    def tearDown(self) -> None:
+        self.stand_in.uninstall()
+
+    def test_latency(self):
+        start = time.perf_counter()
+        generate_node(sc_type.CONST_NODE)
+        self.assertGreaterEqual(time.perf_counter() - start, LATENCY)
+        self.assertEqual(self.stand_in.round_trips, 1)
+
+    def test_search_by_template(self):
+        source = generate_node(sc_type.CONST_NODE)
+        targets = {generate_node(sc_type.CONST_NODE) for _ in range(3)}
+        for target in targets:
+            generate_connector(sc_type.CONST_PERM_POS_ARC, source, target)
+        templ = ScTemplate()
+        templ.triple(source, sc_type.VAR_PERM_POS_ARC, sc_type.VAR_NODE >> "_target")
+        self.assertEqual({result.get("_target") for result in client.search_by_template(templ)}, targets)
+        client.erase_elements(*targets)
+        self.assertEqual(client.search_by_template(templ), [])
+
+    def test_keynodes(self):
+        params = ScIdtfResolveParams(idtf="test_stand_in_keynode", type=sc_type.CONST_NODE)
+        keynode = client.resolve_keynodes(params)[0]
+        self.assertTrue(keynode.is_valid())
+        search_params = ScIdtfResolveParams(idtf="test_stand_in_keynode", type=None)
+        self.assertEqual(client.resolve_keynodes(search_params, params), [keynode, keynode])
+        self.assertEqual(len(client.search_links_by_contents("test_stand_in_keynode")[0]), 1)
+        client.erase_elements(keynode)
+        self.assertFalse(client.resolve_keynodes(search_params)[0].is_valid())
+
+    def test_events(self):
+        source = generate_node(sc_type.CONST_NODE)
+        targets = []
+        is_called = threading.Event()
+
+        def callback(_, __, target) -> ScResult:
+            targets.append(target)
+            is_called.set()
+            return ScResult.OK
+
+        params = ScEventSubscriptionParams(source, ScEventType.AFTER_GENERATE_OUTGOING_ARC, callback)
+        client.create_elementary_event_subscriptions(params)
+        target = generate_node(sc_type.CONST_NODE)
+        generate_connector(sc_type.CONST_PERM_POS_ARC, source, target)
+        self.assertTrue(is_called.wait(1))
+        self.assertEqual(targets, [target])
+        client.disconnect()  # Subscriptions of the closed connection are destroyed
+        client.connect("memory://")
+        is_called.clear()
+        generate_connector(sc_type.CONST_PERM_POS_ARC, source, target)
+        self.assertFalse(is_called.wait(0.1))
+
+    def test_server_uninstalls_stand_in(self):
+        self.stand_in.uninstall()
+        send_message = session.send_message
+        server = ScServer("memory://")
+        with server.connect():
+            self.assertIsNot(session.send_message, send_message)
+        self.assertIs(session.send_message, send_message)
+        self.stand_in.install()
+
+    def test_unsupported_template(self):
+        with self.assertRaises(ServerError):
+            client.search_by_template("unsupported_template")
@@ -3,24 +3,37 @@ This source file is part of an OSTIS project. For the latest info, see https://g
 Distributed under the MIT License
 (See an accompanying file LICENSE or a copy at https://opensource.org/licenses/MIT)
 """
+import threading
 import time
+from unittest.mock import patch
 
+from sc_client import client
 from sc_client.client import erase_elements
 from sc_client.constants import sc_type
 from sc_client.constants.common import ScEventType
+from sc_client.models import ScAddr
 
 from sc_kpm import ScAgent, ScKeynodes, ScModule
 from sc_kpm.identifiers import ActionStatus, CommonIdentifiers
 from sc_kpm.sc_result import ScResult
+from sc_kpm.sc_tracer import ScTracer, max_round_trips
+from sc_kpm.utils import action_utils
 from sc_kpm.utils.action_utils import (
+    ActionOutcome,
+    ActionSpec,
+    _ActionsCompletion,
     add_action_arguments,
+    as_completed,
     call_action,
     call_agent,
     check_action_class,
     execute_action,
     execute_agent,
     finish_action_with_status,
+    gather,
     generate_action,
+    get_action_arguments,
+    submit_actions,
     wait_agent,
 )
 from sc_kpm.utils.common_utils import (
@@ -29,7 +42,7 @@ from sc_kpm.utils.common_utils import (
     generate_node,
     search_element_by_role_relation,
 )
-from tests.common_tests import BaseTestCase
+from tests.common_tests import SC_SERVER_URL, BaseTestCase
 
 test_node_idtf = "test_node"
 
@@ -67,6 +80,21 @@ class TestActionUtils(BaseTestCase):
         self.assertFalse(check_action_class(action_class_node, test_node))
         self.assertFalse(check_action_class(action_class_idtf, test_node))
 
+    def test_get_action_arguments(self):
+        argument1 = generate_node(sc_type.CONST_NODE)
+        argument2 = generate_node(sc_type.CONST_NODE)
+        action_node = call_agent({argument1: False, argument2: True}, [], "wrong_agent")
+        with max_round_trips(1):
+            arguments = get_action_arguments(action_node, 3)
+        self.assertEqual(arguments[0], argument1)
+        self.assertTrue(check_connector(sc_type.VAR_TEMP_POS_ARC, arguments[1], argument2))
+        self.assertFalse(arguments[2].is_valid())
+        with max_round_trips(2):
+            self.assertEqual(get_action_arguments(action_node, 3, True), [argument1, argument2, ScAddr(0)])
+        static_action_node = call_agent({argument1: False}, [], "wrong_agent")
+        with max_round_trips(1):
+            self.assertEqual(get_action_arguments(static_action_node, 1, True), [argument1])
+
     def test_execute_agent(self):
         module = ScModuleTest()
         self.server.add_modules(module)
@@ -86,6 +114,24 @@ class TestActionUtils(BaseTestCase):
             self.assertTrue(result)
         self.server.remove_modules(module)
 
+    def test_call_agent_in_one_round_trip(self):
+        module = ScModuleTest()
+        self.server.add_modules(module)
+        with self.server.register_modules():
+            node1 = generate_node(sc_type.CONST_NODE)
+            node2 = generate_node(sc_type.CONST_NODE)
+            wait_agent(1, call_agent({node1: False, node2: True}, [], test_node_idtf))  # Keynodes are cached
+            with max_round_trips(1):
+                action = call_agent({node1: False, node2: True}, [], test_node_idtf)
+            wait_agent(1, action, ScKeynodes[ActionStatus.ACTION_FINISHED])
+            self.assertEqual(search_element_by_role_relation(action, ScKeynodes.rrel_index(1)), node1)
+            dynamic_node = search_element_by_role_relation(action, ScKeynodes.rrel_index(2))
+            self.assertTrue(check_connector(sc_type.VAR_TEMP_POS_ARC, dynamic_node, node2))
+            self.assertTrue(
+                check_connector(sc_type.VAR_PERM_POS_ARC, ScKeynodes[ActionStatus.ACTION_FINISHED_SUCCESSFULLY], action)
+            )
+        self.server.remove_modules(module)
+
     def test_wrong_execute_agent(self):
         module = ScModuleTest()
         self.server.add_modules(module)
@@ -175,20 +221,100 @@ class TestActionUtils(BaseTestCase):
             timeout = 0.5
             # Action is not finished while waiting
             start_time = time.time()
-            wait_agent(timeout, action_node, ScKeynodes[ActionStatus.ACTION_FINISHED])
+            self.assertFalse(wait_agent(timeout, action_node, ScKeynodes[ActionStatus.ACTION_FINISHED]))
             timedelta = time.time() - start_time
             self.assertGreater(timedelta, timeout)
             # Action is finished while waiting
             call_action(action_node, test_node_idtf)
             start_time = time.time()
-            wait_agent(timeout, action_node, ScKeynodes[ActionStatus.ACTION_FINISHED])
+            self.assertTrue(wait_agent(timeout, action_node, ScKeynodes[ActionStatus.ACTION_FINISHED]))
             timedelta = time.time() - start_time
             self.assertLess(timedelta, timeout)
             # Action finished before waiting
             call_action(action_node, test_node_idtf)
             time.sleep(0.1)
             start_time = time.time()
-            wait_agent(timeout, action_node, ScKeynodes[ActionStatus.ACTION_FINISHED])
+            self.assertTrue(wait_agent(timeout, action_node, ScKeynodes[ActionStatus.ACTION_FINISHED]))
             timedelta = time.time() - start_time
             self.assertLess(timedelta, timeout)
         self.server.remove_modules(module)
+
+    def test_wait_actions_with_one_subscription(self):
+        module = ScModuleTest()
+        self.server.add_modules(module)
+        with self.server.register_modules():
+            wait_agent(1, call_agent({}, [], test_node_idtf))
+            actions = [call_agent({}, [], test_node_idtf) for _ in range(10)]
+            results = []
+            with ScTracer(all_threads=True) as tracer:
+                threads = [threading.Thread(target=lambda a=a: results.append(wait_agent(1, a))) for a in actions]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+            self.assertEqual(results, [True] * len(actions))
+            self.assertNotIn("CREATE_EVENT_SUBSCRIPTIONS", tracer.summary())
+            self.assertNotIn("DESTROY_EVENT_SUBSCRIPTIONS", tracer.summary())
+        self.server.remove_modules(module)
+
+    def test_submit_actions(self):
+        module = ScModuleTest()
+        self.server.add_modules(module)
+        with self.server.register_modules():
+            specs = [ActionSpec({}, [], test_node_idtf) for _ in range(20)]
+            specs.append(ActionSpec({}, [], "wrong_agent"))
+            with ScTracer() as tracer:
+                futures = submit_actions(specs, batch_size=10)
+            self.assertEqual(tracer.summary()["GENERATE_ELEMENTS"][0], 3)
+            outcomes = gather(futures, timeout=0.5)
+            self.assertEqual(outcomes, [ActionOutcome.SUCCESSFUL] * 20 + [ActionOutcome.TIMED_OUT])
+            self.assertEqual(len({future.action_node for future in futures}), len(specs))
+        self.server.remove_modules(module)
+
+    def test_as_completed(self):
+        module = ScModuleTest()
+        self.server.add_modules(module)
+        with self.server.register_modules():
+            timed_out, failed, successful = submit_actions(
+                [
+                    ActionSpec({}, [], "wrong_agent"),
+                    ActionSpec({}, [], "wrong_agent"),
+                    ActionSpec({}, [], test_node_idtf),
+                ]
+            )
+            finish_action_with_status(failed.action_node, False)
+            completed = list(as_completed([timed_out, failed, successful], timeout=0.5))
+            self.assertEqual(set(completed[:2]), {failed, successful})
+            self.assertEqual(completed[2], timed_out)
+            self.assertEqual(failed.result(), ActionOutcome.UNSUCCESSFUL)
+            self.assertEqual(successful.result(), ActionOutcome.SUCCESSFUL)
+            self.assertEqual(timed_out.result(), ActionOutcome.TIMED_OUT)
+        self.server.remove_modules(module)
+
+    def test_wait_action_after_client_reconnection(self):
+        self.assertFalse(wait_agent(0.1, generate_action()))  # The reaction node is subscribed
+        client.disconnect()
+        client.connect(SC_SERVER_URL)
+        action_node = generate_action()
+        threading.Timer(0.1, finish_action_with_status, (action_node,)).start()
+        self.assertTrue(wait_agent(1, action_node))
+
+    def test_resubscribe_during_subscription(self):
+        create_subscriptions = action_utils.create_elementary_event_subscriptions
+        resubscriptions = []
+
+        def create_and_resubscribe(*params):
+            subscriptions = create_subscriptions(*params)
+            if not resubscriptions:
+                resubscriptions.append(params)
+                _ActionsCompletion._resubscribe()  # Like a reconnection handler run by the failed request
+            return subscriptions
+
+        with patch.object(action_utils, "create_elementary_event_subscriptions", create_and_resubscribe):
+            waiting = threading.Thread(
+                target=wait_agent, args=(0.1, generate_action(), generate_node(sc_type.CONST_NODE)), daemon=True
+            )
+            waiting.start()
+            waiting.join(5)
+        self.assertFalse(waiting.is_alive())
+        self.assertTrue(resubscriptions)
@@ -0,0 +1,52 @@
+"""
+This source file is part of an OSTIS project. For the latest info, see https://github.com/ostis-ai
+Distributed under the MIT License
+(See an accompanying file LICENSE or a copy at https://opensource.org/licenses/MIT)
+"""
+import asyncio
+
+from sc_kpm.utils import async_action_utils
+from sc_kpm.utils.action_utils import _ActionsCompletion, generate_action
+from tests.common_tests import BaseTestCase
+from tests.test_utils.test_action_utils import ScModuleTest, test_node_idtf
+
+
+class TestAsyncActionUtils(BaseTestCase):
+    def test_execute_agents(self):
+        module = ScModuleTest()
+        self.server.add_modules(module)
+        with self.server.register_modules():
+
+            async def execute_agents():
+                return await asyncio.gather(
+                    *(async_action_utils.execute_agent({}, [], test_node_idtf, wait_time=1) for _ in range(20))
+                )
+
+            results = asyncio.run(execute_agents())
+            self.assertEqual([is_successful for _, is_successful in results], [True] * 20)
+            self.assertEqual(len({action for action, _ in results}), 20)
+        self.server.remove_modules(module)
+
+    def test_execute_action(self):
+        module = ScModuleTest()
+        self.server.add_modules(module)
+        with self.server.register_modules():
+            action_node = generate_action()
+            self.assertTrue(asyncio.run(async_action_utils.execute_action(action_node, test_node_idtf, wait_time=1)))
+            self.assertFalse(
+                asyncio.run(async_action_utils.execute_action(generate_action(), "wrong_agent", wait_time=0.1))
+            )
+        self.server.remove_modules(module)
+
+    def test_cancel_wait(self):
+        action_node = generate_action()
+
+        async def cancel_wait() -> None:
+            wait = asyncio.ensure_future(async_action_utils.wait_agent(5, action_node))
+            await asyncio.sleep(0.1)
+            wait.cancel()
+            await asyncio.gather(wait, return_exceptions=True)
+            self.assertTrue(wait.cancelled())
+
+        asyncio.run(cancel_wait())
+        self.assertFalse(any(action == action_node for _, action in _ActionsCompletion._waiters))
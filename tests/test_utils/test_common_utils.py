@@ -8,8 +8,10 @@ import pytest
 from sc_client import client
 from sc_client.client import erase_elements
 from sc_client.constants import exceptions, sc_type
+from sc_client.models import ScIdtfResolveParams
 
 from sc_kpm import ScKeynodes
+from sc_kpm.sc_tracer import ScTracer
 from sc_kpm.utils.common_utils import (
     check_connector,
     erase_connectors,
@@ -23,6 +25,7 @@ from sc_kpm.utils.common_utils import (
     generate_non_role_relation,
     generate_role_relation,
     get_element_system_identifier,
+    get_elements_system_identifiers,
     get_link_content_data,
     search_connector,
     search_connectors,
@@ -131,6 +134,36 @@ class TestCommonUtils(BaseTestCase):
         test_node = ScKeynodes[test_idtf]
         assert get_element_system_identifier(test_node) == test_idtf
 
+    def test_get_elements_system_identifiers(self):
+        test_idtfs = ["test_bulk_system_identifier_1", "test_bulk_system_identifier_2"]
+        test_nodes = client.resolve_keynodes(
+            *(ScIdtfResolveParams(idtf=idtf, type=sc_type.CONST_NODE) for idtf in test_idtfs)
+        )
+        keynode = ScKeynodes["rrel_1"]
+        anonymous_node = generate_node(sc_type.CONST_NODE)
+        addrs = [*test_nodes, keynode, anonymous_node, test_nodes[0]]
+        expected_idtfs = [*test_idtfs, "rrel_1", "", test_idtfs[0]]
+        with ScTracer() as tracer:
+            assert get_elements_system_identifiers(*addrs) == expected_idtfs
+        assert tracer.round_trips == 2  # One template search and one content request
+        assert "GENERATE_ELEMENTS" not in tracer.summary()
+        assert "ERASE_ELEMENTS" not in tracer.summary()
+        assert get_element_system_identifier(anonymous_node) == ""
+        assert get_elements_system_identifiers() == []
+        ScKeynodes.configure_identifiers_cache(max_size=10)
+        try:
+            assert get_elements_system_identifiers(*addrs) == expected_idtfs
+            with ScTracer() as tracer:
+                assert get_elements_system_identifiers(*test_nodes) == test_idtfs
+            assert tracer.round_trips == 0
+            ScKeynodes.invalidate_identifiers_cache(test_nodes[0])
+            with ScTracer() as tracer:
+                assert get_elements_system_identifiers(*test_nodes) == test_idtfs
+            assert tracer.round_trips == 2
+        finally:
+            ScKeynodes.configure_identifiers_cache(max_size=0)
+        assert erase_elements(*test_nodes, anonymous_node)
+
     def test_deletion_utils(self):
         src, rrel_trg, nrel_trg = generate_nodes(sc_type.CONST_NODE, sc_type.CONST_NODE, sc_type.CONST_NODE)
         rrel_connector = generate_binary_relation(sc_type.CONST_PERM_POS_ARC, src, rrel_trg)